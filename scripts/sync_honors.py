@@ -6,15 +6,65 @@ Sekai Honors Sync Script
 
 import os
 import sys
+import asyncio
 import json
+import hashlib
+import hmac
+import time
 import logging
-from typing import Optional
-from datetime import datetime
+import tempfile
+import threading
+import itertools
+import re
+import random
+import signal
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import NamedTuple, Optional
+from operator import attrgetter, itemgetter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import requests
+from requests.adapters import HTTPAdapter
 import psycopg2
 from psycopg2.extras import execute_values, Json
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import psycopg
+    from psycopg.types.json import Jsonb
+except ImportError:
+    psycopg = None
+
+try:
+    import brotli  # noqa: F401  urllib3 解压 br 响应需要
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -42,224 +92,1993 @@ SERVER_NAMES = {
 }
 
 # GitHub Raw 文件 URL 模板
-RAW_URL_TEMPLATE = 'https://raw.githubusercontent.com/Team-Haruki/{repo}/main/master/{file}'
+# {ref} 为探测到的上游提交 SHA，使下载内容与记录的 SHA 一致 (分支 URL 会被缓存数分钟到数小时)；
+# 探测失败时为 DEFAULT_REF
+RAW_URL_TEMPLATE = 'https://raw.githubusercontent.com/Team-Haruki/{repo}/{ref}/master/{file}'
 
 # jsDelivr CDN URL 模板（备用）
-CDN_URL_TEMPLATE = 'https://cdn.jsdelivr.net/gh/Team-Haruki/{repo}@main/master/{file}'
+CDN_URL_TEMPLATE = 'https://cdn.jsdelivr.net/gh/Team-Haruki/{repo}@{ref}/master/{file}'
+
+# 未探测到提交 SHA 时使用的分支
+DEFAULT_REF = 'main'
+
+# 数据来源，按优先级排列
+SOURCES = (
+    ('raw', RAW_URL_TEMPLATE),
+    ('cdn', CDN_URL_TEMPLATE),
+)
+
+# HTTP 请求超时 (秒)
+HTTP_TIMEOUT = 30
+
+# HTTP 连接池大小
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+
+# 使用 HTTP/2 (需要安装 httpx[http2])
+HTTP2_ENABLED = os.environ.get('HTTP2', '') == '1'
+
+# 对冲请求: 首选来源在延迟内未返回响应头时，同时请求下一个来源并取先完成者
+HEDGE_ENABLED = os.environ.get('HEDGE', '1') == '1'
+
+# 尚无延迟历史时的对冲延迟 (秒)；有历史后使用该来源近期的 p95 延迟
+HEDGE_DELAY = float(os.environ.get('HEDGE_DELAY', '2.0'))
+HEDGE_MIN_DELAY = 0.2
+HEDGE_MAX_DELAY = HTTP_TIMEOUT / 3
+
+# 熔断: 某来源连续失败达到阈值后，在冷却时间 (秒) 内不再优先尝试
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '3'))
+CIRCUIT_COOLDOWN = int(os.environ.get('CIRCUIT_COOLDOWN', '1800'))
+
+# 网络请求可能抛出的异常
+HTTP_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+# 本地缓存目录 (ETag / Last-Modified 等)，设为空字符串则禁用
+CACHE_DIR = os.environ.get('CACHE_DIR', '.cache')
+
+# fetch_json 的返回标记: 上游文件未变化 (HTTP 304)
+NOT_MODIFIED = object()
+
+# 流式解析 JSON (需要安装 ijson)：逐条解析并分批写库，峰值内存与文件大小无关
+STREAM_JSON = os.environ.get('STREAM_JSON', '') == '1'
+
+# JSON 解码器: auto / msgspec / orjson / json；auto 按此顺序选择已安装的
+JSON_DECODER = os.environ.get('JSON_DECODER', 'auto')
+
+# 写库方式: copy (COPY 到临时表后一条 INSERT ... ON CONFLICT) / values (execute_values 分批 upsert)
+# / pipeline (psycopg 3 管道模式 + 服务端预备语句，需要 pip install "psycopg[binary]")
+LOAD_METHOD = os.environ.get('LOAD_METHOD', 'copy')
+
+# 写库策略: diff (与数据库现有数据比对，只写入新增与变化的行) / full (每次 upsert 全部数据)
+# / swap (分区表把该服务器的全部数据加载到影子表，建索引并核对行数后用 DETACH / ATTACH 原子替换)
+SYNC_STRATEGY = os.environ.get('SYNC_STRATEGY', 'diff')
+
+# 上游已删除的记录: soft (设置 deleted_at) / hard (直接删除) / off (保留)
+DELETE_MODE = os.environ.get('DELETE_MODE', 'soft')
+
+# 单次最多允许删除的比例，超过则中止同步 (防止下载内容被截断时误删)
+DELETE_MAX_RATIO = float(os.environ.get('DELETE_MAX_RATIO', '0.1'))
+
+# 设为 1 时把 honors.levels 拆分写入 honor_levels 表 (每个等级一行)
+HONOR_LEVELS = os.environ.get('HONOR_LEVELS', '') == '1'
+
+# 每批写入数据库的记录数
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', '1000'))
+
+# 下载内容在内存中暂存的上限 (字节)，超过后转存到临时文件
+SPOOL_MAX_BYTES = 1024 * 1024
+
+# 上游提交 SHA 探测地址，需返回纯文本 SHA 或含 sha 字段的 JSON (可指向本地替身服务)
+SHA_PROBE_URL_TEMPLATE = os.environ.get(
+    'SHA_PROBE_URL_TEMPLATE',
+    'https://api.github.com/repos/Team-Haruki/{repo}/commits/main',
+)
+SHA_PROBE_TIMEOUT = 5
+
+# 设为 1 时忽略 SHA 探测结果与 ETag 缓存，完整同步一次
+FORCE_SYNC = os.environ.get('FORCE_SYNC', '') == '1'
+
+# 设为 1 时用 asyncio 在一个事件循环中并发同步全部服务器 (需要 pip install httpx)
+ASYNC_MODE = os.environ.get('ASYNC', '') == '1'
+
+# 设为 1 时作为常驻进程运行，按间隔轮询上游 (代替定时任务)
+DAEMON = os.environ.get('DAEMON', '') == '1'
+
+# 轮询间隔 (秒)，可用 POLL_INTERVAL_<SERVER> 为单个服务器单独设置，如 POLL_INTERVAL_JP
+POLL_INTERVAL = float(os.environ.get('POLL_INTERVAL', '300'))
+
+# 轮询间隔的随机抖动比例，避免各服务器的请求集中在同一时刻
+POLL_JITTER = float(os.environ.get('POLL_JITTER', '0.1'))
+
+# 常驻模式下接收 GitHub push webhook 的端口，留空则不监听
+WEBHOOK_PORT = os.environ.get('WEBHOOK_PORT', '')
+
+# GitHub webhook 的 secret，用于校验 X-Hub-Signature-256；设置 WEBHOOK_PORT 时必填
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+
+# 收到 push 后等待的秒数，期间的多次 push 合并为一次同步
+WEBHOOK_DEBOUNCE = float(os.environ.get('WEBHOOK_DEBOUNCE', '10'))
+
+# 数据库连接池: 最大连接数、连接最长存活时间 (秒)、空闲多久后复用前先做健康检查 (秒)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_MAX_LIFETIME = float(os.environ.get('DB_MAX_LIFETIME', '3600'))
+DB_HEALTH_CHECK_IDLE = float(os.environ.get('DB_HEALTH_CHECK_IDLE', '30'))
+
+# 数据库迁移: auto (建立连接时执行未执行的迁移) / verify (只校验，落后则报错) / off
+MIGRATE = os.environ.get('MIGRATE', 'auto')
+
+# 迁移文件目录，文件名形如 0001_initial.sql，按编号顺序执行
+MIGRATIONS_DIR = os.environ.get(
+    'MIGRATIONS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'migrations'),
+)
+
+
+def _load_json_file(path: Optional[str]) -> dict:
+    """读取本地缓存文件，不存在或损坏时返回空字典"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache {path}: {e}")
+        return {}
+
+
+def _save_json_file(path: Optional[str], data: dict) -> None:
+    """原子地写入本地缓存文件"""
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to write cache {path}: {e}")
+
+
+class ValidatorCache:
+    """按 (server, file, 来源) 持久化 ETag / Last-Modified
+
+    不区分 URL 中的提交 SHA：两个来源的 ETag 都由文件内容决定，换了提交但内容未变时仍返回 304。
+
+    本次运行拿到的新校验值先放在 pending 中，只有数据库提交成功后才写回磁盘，
+    避免事务回滚后下次运行因 304 而跳过尚未写入的数据。
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries = _load_json_file(path)
+        self.pending = {}
+
+    @staticmethod
+    def key(server: str, filename: str, source: str) -> str:
+        return f"{server}|{filename}|{source}"
+
+    def request_headers(self, key: str) -> dict:
+        entry = self.entries.get(key) or {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def update(self, key: str, resp) -> None:
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.pending[key] = {'etag': etag, 'last_modified': last_modified}
+
+    def discard(self) -> None:
+        self.pending = {}
+
+    def save(self) -> None:
+        if not self.pending:
+            return
+        self.entries.update(self.pending)
+        self.pending = {}
+        _save_json_file(self.path, self.entries)
+
+
+class SourceHealth:
+    """各数据来源的健康状况 (成功率、延迟、熔断)，跨运行持久化
+
+    来源排序: 未熔断的在前，按成功率降序、p50 延迟升序；
+    熔断中的来源排在最后，仅在其它来源都失败时才会尝试。
+    成功率与延迟都只统计最近 MAX_SAMPLES 次，过去的故障不会永久影响排序。
+    """
+
+    MAX_SAMPLES = 50
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.stats = _load_json_file(path)
+        self._lock = threading.Lock()
+
+    def _entry(self, source: str) -> dict:
+        return self.stats.setdefault(source, {
+            'successes': 0,
+            'failures': 0,
+            'consecutive_failures': 0,
+            'latencies': [],
+            'outcomes': [],
+            'last_failure': None,
+            'last_error': None,
+            'open_until': 0,
+        })
+
+    def record_success(self, source: str, latency: float) -> None:
+        with self._lock:
+            entry = self._entry(source)
+            entry['successes'] += 1
+            entry['outcomes'] = (entry.get('outcomes', []) + [1])[-self.MAX_SAMPLES:]
+            entry['consecutive_failures'] = 0
+            entry['open_until'] = 0
+            entry['latencies'] = (entry['latencies'] + [round(latency, 4)])[-self.MAX_SAMPLES:]
+
+    def record_latency(self, source: str, latency: float) -> None:
+        """只记录延迟样本 (对冲中落败的请求)，不计入成功或失败"""
+        with self._lock:
+            entry = self._entry(source)
+            entry['latencies'] = (entry['latencies'] + [round(latency, 4)])[-self.MAX_SAMPLES:]
+
+    def record_failure(self, source: str, error: Exception) -> None:
+        with self._lock:
+            entry = self._entry(source)
+            entry['failures'] += 1
+            entry['outcomes'] = (entry.get('outcomes', []) + [0])[-self.MAX_SAMPLES:]
+            entry['consecutive_failures'] += 1
+            entry['last_failure'] = time.time()
+            entry['last_error'] = str(error)[:200]
+            if entry['consecutive_failures'] >= CIRCUIT_FAILURE_THRESHOLD:
+                entry['open_until'] = time.time() + CIRCUIT_COOLDOWN
+                logger.warning(f"Circuit opened for source {source} "
+                               f"after {entry['consecutive_failures']} consecutive failures")
+
+    def is_open(self, source: str) -> bool:
+        return self.stats.get(source, {}).get('open_until', 0) > time.time()
+
+    def percentile(self, source: str, q: float) -> Optional[float]:
+        samples = sorted(self.stats.get(source, {}).get('latencies', []))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def success_rate(self, source: str) -> float:
+        """最近 MAX_SAMPLES 次请求的成功率 (successes / failures 为累计值，只用于展示)"""
+        outcomes = self.stats.get(source, {}).get('outcomes') or []
+        return sum(outcomes) / len(outcomes) if outcomes else 1.0
+
+    def rank(self, sources: list) -> list:
+        """sources 为 [(name, url), ...]，返回排序后的副本 (同等情况下保持原顺序)"""
+        with self._lock:
+            def sort_key(item):
+                name = item[0]
+                p50 = self.percentile(name, 0.5)
+                return (
+                    self.is_open(name),
+                    -round(self.success_rate(name), 2),
+                    p50 if p50 is not None else HEDGE_DELAY,
+                )
+            return sorted(sources, key=sort_key)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    'success_rate': round(self.success_rate(name), 3),
+                    'p50': self.percentile(name, 0.5),
+                    'p95': self.percentile(name, 0.95),
+                    'last_failure': entry.get('last_failure'),
+                    'circuit_open': self.is_open(name),
+                }
+                for name, entry in self.stats.items()
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            _save_json_file(self.path, self.stats)
+
+
+# 记录字段的必填标记
+REQUIRED = object()
+
+
+class _SlotsRecord:
+    """未安装 msgspec 时的记录基类: 仅有 __slots__ 属性，不做类型校验"""
+
+    __slots__ = ()
+    _json_fields = ()
+
+    @classmethod
+    def from_dict(cls, item):
+        if not isinstance(item, dict):
+            raise ValueError(f"expected a JSON object for {cls.__name__}, got {type(item).__name__}")
+        record = cls.__new__(cls)
+        for attr, key, default in cls._json_fields:
+            if default is REQUIRED:
+                default = None
+            elif isinstance(default, list):
+                default = list(default)
+            setattr(record, attr, item.get(key, default))
+        return record
+
+    def __repr__(self):
+        values = ', '.join(f"{attr}={getattr(self, attr)!r}" for attr in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+def _camel(name: str) -> str:
+    first, *rest = name.split('_')
+    return first + ''.join(part.title() for part in rest)
+
+
+def _define_record(name: str, fields: tuple):
+    """按 (属性名, 类型, 默认值) 定义记录类型，JSON 中对应 camelCase 键
+
+    安装了 msgspec 时为 msgspec.Struct (解码即校验类型)，否则为 __slots__ 类。
+    """
+    if msgspec is not None:
+        return msgspec.defstruct(
+            name,
+            [(attr, typ) if default is REQUIRED else (attr, typ, default) for attr, typ, default in fields],
+            rename='camel',
+        )
+    return type(name, (_SlotsRecord,), {
+        '__slots__': tuple(attr for attr, _, _ in fields),
+        '_json_fields': tuple((attr, _camel(attr), default) for attr, _, default in fields),
+    })
+
+
+Honor = _define_record('Honor', (
+    ('id', int, REQUIRED),
+    ('seq', Optional[int], None),
+    ('group_id', Optional[int], None),
+    ('honor_rarity', Optional[str], None),
+    ('name', Optional[str], None),
+    ('assetbundle_name', Optional[str], None),
+    ('levels', list, []),
+))
+
+BondsHonor = _define_record('BondsHonor', (
+    ('id', int, REQUIRED),
+    ('seq', Optional[int], None),
+    ('bonds_group_id', Optional[int], None),
+    ('game_character_unit_id1', Optional[int], None),
+    ('game_character_unit_id2', Optional[int], None),
+    ('honor_rarity', Optional[str], None),
+    ('name', Optional[str], None),
+    ('description', Optional[str], None),
+    ('levels', list, []),
+))
+
+HonorGroup = _define_record('HonorGroup', (
+    ('id', int, REQUIRED),
+    ('name', Optional[str], None),
+    ('honor_type', Optional[str], None),
+    ('background_assetbundle_name', Optional[str], None),
+))
+
+# 各 masterdata 文件对应的记录类型
+RECORD_TYPES = {
+    'honors.json': Honor,
+    'bondsHonors.json': BondsHonor,
+    'honorGroups.json': HonorGroup,
+}
+
+
+class Lookup(NamedTuple):
+    """按外键从另一个 masterdata 文件的记录中取值"""
+    source: str     # 被关联的文件
+    on: str         # 本记录中的外键属性，与被关联记录的 id 对应
+    attr: str       # 被关联记录的属性
+
+
+class ChildSpec(NamedTuple):
+    """记录中的嵌套列表到子表的同步规则，列表的每一项为子表的一行
+
+    子表主键为 (server, 父表主键列, key 列)；fields 为 (列名, 列表项中的 JSON 键)。
+    """
+    table: str
+    attr: str           # 父记录中的列表属性
+    key: tuple          # (主键列名, JSON 键)
+    fields: tuple
+    jsonb: tuple = ()
+    partitioned: bool = False
+
+
+class TableSpec(NamedTuple):
+    """一个 masterdata 文件到一张表的同步规则
+
+    fields 按列顺序给出 (列名, 记录属性或 Lookup)；server 列与 content_hash 由引擎添加。
+    表名同时作为 results 中的键。partitioned 的表按 server 做 LIST 分区，
+    分区名为 <表名>_<server>，读写直接针对该服务器的分区。
+    children 中的子表在写入本表之后、同一事务中同步。
+    """
+    source: str
+    table: str
+    key: tuple          # (主键列名, 记录属性)，主键为 (server, 该列)
+    fields: tuple
+    jsonb: tuple = ()
+    partitioned: bool = False
+    children: tuple = ()
+
+    @property
+    def dependencies(self) -> tuple:
+        """通过 Lookup 关联的文件"""
+        return tuple(dict.fromkeys(f.source for _, f in self.fields if isinstance(f, Lookup)))
+
+
+# 按同步顺序排列的表；新增 masterdata 文件时在 RECORD_TYPES 中定义记录类型并在此添加一项
+TABLE_SPECS = (
+    TableSpec(
+        source='honors.json',
+        table='honors',
+        key=('honor_id', 'id'),
+        fields=(
+            ('seq', 'seq'),
+            ('group_id', 'group_id'),
+            ('group_name', Lookup('honorGroups.json', 'group_id', 'name')),
+            ('group_type', Lookup('honorGroups.json', 'group_id', 'honor_type')),
+            ('honor_rarity', 'honor_rarity'),
+            ('name', 'name'),
+            ('asset_bundle_name', 'assetbundle_name'),
+            ('levels', 'levels'),
+        ),
+        jsonb=('levels',),
+        partitioned=True,
+        children=(
+            ChildSpec(
+                table='honor_levels',
+                attr='levels',
+                key=('level', 'level'),
+                fields=(
+                    ('bonus', 'bonus'),
+                    ('description', 'description'),
+                    ('asset_bundle_name', 'assetbundleName'),
+                    ('honor_rarity', 'honorRarity'),
+                ),
+                partitioned=True,
+            ),
+        ) if HONOR_LEVELS else (),
+    ),
+    TableSpec(
+        source='bondsHonors.json',
+        table='bonds_honors',
+        key=('bonds_honor_id', 'id'),
+        fields=(
+            ('seq', 'seq'),
+            ('bonds_group_id', 'bonds_group_id'),
+            ('game_character_unit_id1', 'game_character_unit_id1'),
+            ('game_character_unit_id2', 'game_character_unit_id2'),
+            ('honor_rarity', 'honor_rarity'),
+            ('name', 'name'),
+            ('description', 'description'),
+            ('levels', 'levels'),
+        ),
+        jsonb=('levels',),
+        partitioned=True,
+    ),
+    TableSpec(
+        source='honorGroups.json',
+        table='honor_groups',
+        key=('group_id', 'id'),
+        fields=(
+            ('name', 'name'),
+            ('honor_type', 'honor_type'),
+            ('background_asset_bundle_name', 'background_assetbundle_name'),
+        ),
+    ),
+)
+
+# 每次同步需要的 masterdata 文件
+MASTERDATA_FILES = tuple(dict.fromkeys(
+    source for spec in TABLE_SPECS for source in spec.dependencies + (spec.source,)
+))
+
+
+def _resolve_json_decoder() -> str:
+    available = {'msgspec': msgspec is not None, 'orjson': orjson is not None, 'json': True}
+    if JSON_DECODER == 'auto':
+        return next(name for name, ok in available.items() if ok)
+    if not available.get(JSON_DECODER):
+        logger.warning(f"JSON decoder {JSON_DECODER!r} is unavailable, falling back to json")
+        return 'json'
+    return JSON_DECODER
+
+
+JSON_BACKEND = _resolve_json_decoder()
+
+
+def _to_record(record_type, item):
+    """把解码得到的 dict 转为记录类型"""
+    if msgspec is not None:
+        return msgspec.convert(item, record_type)
+    return record_type.from_dict(item)
+
+
+def decode_records(raw: bytes, record_type) -> list:
+    """把 JSON 数组解码为记录列表，格式或类型不符时抛出 ValueError"""
+    if JSON_BACKEND == 'msgspec':
+        return msgspec.json.decode(raw, type=list[record_type])
+
+    items = orjson.loads(raw) if JSON_BACKEND == 'orjson' else json.loads(raw)
+    if not isinstance(items, list):
+        raise ValueError(f"expected a JSON array, got {type(items).__name__}")
+    return [_to_record(record_type, item) for item in items]
+
+
+class SchemaError(Exception):
+    """数据库结构与迁移文件不一致"""
+
+
+class DeletionThresholdExceeded(Exception):
+    """待删除的行数超过 DELETE_MAX_RATIO"""
+
+
+class RowCountMismatch(Exception):
+    """影子表的行数与获取到的记录数不一致"""
+
+
+class FetchCancelled(Exception):
+    """对冲请求中落败的一方"""
+
+
+class MasterData:
+    """下载得到的 masterdata 文件
+
+    原始内容暂存在 SpooledTemporaryFile 中。非流式模式下 load() 整体解码一次并缓存；
+    流式模式下每次迭代都用 ijson 逐条解析，不保留解码后的列表；各次迭代通过
+    _BodyReader 维护各自的读取位置，可以交错进行 (如迭代途中调用 len())。
+    迭代得到的是 record_type 的实例 (见 RECORD_TYPES)。
+    """
+
+    def __init__(self, body, sha256: str, size: int, record_type):
+        self.body = body
+        self.sha256 = sha256
+        self.size = size
+        self.record_type = record_type
+        self._items = None
+
+    @property
+    def streaming(self) -> bool:
+        return STREAM_JSON and ijson is not None
+
+    def load(self) -> None:
+        """非流式模式下解码全部内容，JSON 无效时抛出 ValueError"""
+        if self.streaming or self._items is not None:
+            return
+        self.body.seek(0)
+        self._items = decode_records(self.body.read(), self.record_type)
+
+    def __iter__(self):
+        if self.streaming:
+            return (
+                _to_record(self.record_type, item)
+                for item in ijson.items(_BodyReader(self.body), 'item', use_float=True)
+            )
+        self.load()
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self) if self.streaming else len(self._items or ())
+
+    def __bool__(self) -> bool:
+        return next(iter(self), None) is not None
+
+    def close(self) -> None:
+        self._items = None
+        self.body.close()
+
+
+class _BodyReader:
+    """共享同一个临时文件、但拥有独立读取位置的只读视图 (每次 read 前先 seek)"""
+
+    def __init__(self, body):
+        self.body = body
+        self.pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        self.body.seek(self.pos)
+        data = self.body.read(size)
+        self.pos += len(data)
+        return data
+
+
+def _iter_body(resp, chunk_size: int = 64 * 1024):
+    """分块读取流式响应内容 (兼容 requests 与 httpx)"""
+    if httpx is not None and isinstance(resp, httpx.Response):
+        return resp.iter_bytes(chunk_size)
+    return resp.iter_content(chunk_size)
+
+
+class _Spool:
+    """边下载边写入临时文件 (超过 SPOOL_MAX_BYTES 落盘) 并计算 sha256"""
+
+    def __init__(self):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+
+    def masterdata(self, filename: str) -> 'MasterData':
+        return MasterData(self.file, self.digest.hexdigest(), self.size, RECORD_TYPES[filename])
+
+
+def _copy_text(value) -> str:
+    """按 COPY text 格式转义单个值"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+class _CopyStream:
+    """把行迭代器包装为 COPY FROM STDIN 读取的文本流，按需逐行生成"""
+
+    def __init__(self, rows, jsonb_indexes: set):
+        self._rows = iter(rows)
+        self._jsonb_indexes = jsonb_indexes
+        self._buffer = ''
+        self.count = 0
+
+    def _format(self, row) -> str:
+        return '\t'.join(
+            _copy_text(json.dumps(value, ensure_ascii=False) if i in self._jsonb_indexes else value)
+            for i, value in enumerate(row)
+        ) + '\n'
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += self._format(row)
+            self.count += 1
+
+        if size < 0:
+            chunk, self._buffer = self._buffer, ''
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def _close_late_result(future) -> None:
+    """对冲落败但仍下载完成的请求: 关闭其 MasterData 的临时文件"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    data = future.result()[0]
+    if isinstance(data, MasterData):
+        data.close()
+
+
+def _canonical(value) -> str:
+    """值的规范化 JSON 表示，用于比较 (jsonb 键顺序不影响结果)"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def content_hash(values) -> str:
+    """一组列值的内容哈希"""
+    return hashlib.sha1(_canonical(list(values)).encode('utf-8')).hexdigest()
+
+
+def _batched(iterable, size: int):
+    """按固定大小切分可迭代对象"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def connect_database(database_url: str):
+    """建立数据库连接；LOAD_METHOD=pipeline 时使用 psycopg 3，否则使用 psycopg2"""
+    if LOAD_METHOD == 'pipeline':
+        if psycopg is None:
+            raise RuntimeError('LOAD_METHOD=pipeline requires psycopg 3 (pip install "psycopg[binary]")')
+        return psycopg.connect(database_url, sslmode='require', autocommit=False)
+    conn = psycopg2.connect(database_url, sslmode='require')
+    conn.autocommit = False
+    return conn
+
+
+# psycopg2 与 psycopg 3 的数据库异常
+DB_ERRORS = (psycopg2.Error,) + ((psycopg.Error,) if psycopg is not None else ())
+
+_MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# pg_get_indexdef 结果中的索引名与所属表，改写为在影子表上建立同样的索引
+_INDEX_TARGET = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ ')
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list:
+    """读取迁移文件，返回按版本排序的 [(version, name, checksum, sql)]"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            # 统一换行，避免检出方式不同导致校验和变化
+            sql = f.read().replace('\r\n', '\n')
+        checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), checksum, sql))
+    migrations.sort()
+    versions = [version for version, _, _, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise SchemaError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _applied_migrations(conn) -> dict:
+    """一条查询读出已执行的迁移 {version: checksum}；schema_version 不存在时返回空"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version, checksum FROM schema_version")
+            applied = dict(cur.fetchall())
+    except DB_ERRORS as e:
+        # 42P01: undefined_table
+        if (getattr(e, 'pgcode', None) or getattr(e, 'sqlstate', None)) != '42P01':
+            raise
+        applied = {}
+    conn.rollback()
+    return applied
+
+
+def _pending_migrations(migrations: list, applied: dict) -> list:
+    for version, name, checksum, _ in migrations:
+        if version in applied and applied[version] != checksum:
+            raise SchemaError(f"Checksum mismatch for applied migration {version:04d}_{name}")
+    unknown = set(applied) - {version for version, _, _, _ in migrations}
+    if unknown:
+        raise SchemaError(f"Database has migrations unknown to this script: {sorted(unknown)}")
+    return [migration for migration in migrations if migration[0] not in applied]
+
+
+def ensure_schema(conn) -> None:
+    """校验数据库结构；MIGRATE=auto 时在一个事务中按顺序执行未执行的迁移
+
+    已是最新版本时只需一条查询。已执行的迁移文件被修改过 (校验和不一致) 时抛出 SchemaError。
+    """
+    migrations = load_migrations()
+    pending = _pending_migrations(migrations, _applied_migrations(conn))
+    if not pending:
+        return
+    names = ', '.join(f"{version:04d}_{name}" for version, name, _, _ in pending)
+    if MIGRATE != 'auto':
+        raise SchemaError(f"Database schema is out of date, pending migrations: {names}")
+
+    try:
+        with conn.cursor() as cur:
+            # 事务级 advisory lock，避免多个进程同时迁移
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('sekai-honors-sync migrations'))")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    checksum CHAR(64) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # 拿到锁后重新读取，其它进程可能已经执行过
+            cur.execute("SELECT version, checksum FROM schema_version")
+            for version, name, checksum, sql in _pending_migrations(migrations, dict(cur.fetchall())):
+                logger.info(f"Applying migration {version:04d}_{name}")
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_version (version, name, checksum) VALUES (%s, %s, %s)",
+                    (version, name, checksum),
+                )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+class ConnectionPool:
+    """可在多个 HonorsSyncer 之间共享的数据库连接池
+
+    连接在第一次取用时才建立 (SHA 未变化时不连接数据库)，最多 maxconn 个。
+    取出连接时丢弃已断开或超过 DB_MAX_LIFETIME 的连接，
+    空闲超过 DB_HEALTH_CHECK_IDLE 的连接先用 SELECT 1 检查。
+    """
+
+    def __init__(self, database_url: str, maxconn: int = DB_POOL_SIZE):
+        self.database_url = database_url
+        self.maxconn = maxconn
+        self.closed = False
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        # 空闲连接与各连接的建立时间 / 上次归还时间 (按 id(conn))
+        self._idle = []
+        self._created = {}
+        self._returned = {}
+        # 已占用名额、正在建立的连接数
+        self._connecting = 0
+        self.stats = {
+            'connects': 0,
+            'reuses': 0,
+            'health_checks': 0,
+            'discarded': 0,
+            'connect_seconds': 0.0,
+        }
+
+    def getconn(self):
+        while True:
+            with self._lock:
+                if self.closed:
+                    raise RuntimeError('connection pool is closed')
+                conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    if len(self._created) + self._connecting >= self.maxconn:
+                        raise RuntimeError(f'connection pool exhausted ({self.maxconn} connections)')
+                    # 在锁内先占用名额，建立连接期间其它调用方不会超出 maxconn
+                    self._connecting += 1
+            if conn is None:
+                return self._connect()
+            if self._healthy(conn, self._created[id(conn)], time.monotonic()):
+                with self._lock:
+                    self.stats['reuses'] += 1
+                return conn
+            self._discard(conn)
+
+    def check_schema(self) -> None:
+        """确认数据库结构为最新，失败时抛出异常
+
+        校验在每个连接建立时执行一次，池中已有连接时不再访问数据库。
+        """
+        if MIGRATE == 'off':
+            return
+        with self._schema_lock:
+            with self._lock:
+                if self._created:
+                    return
+            self.putconn(self.getconn())
+
+    def _connect(self):
+        """建立新连接，调用前已在 getconn() 中占用名额；失败时释放名额"""
+        started = time.monotonic()
+        try:
+            conn = connect_database(self.database_url)
+            now = time.monotonic()
+            if MIGRATE != 'off':
+                try:
+                    ensure_schema(conn)
+                except BaseException:
+                    conn.close()
+                    raise
+        except BaseException:
+            with self._lock:
+                self._connecting -= 1
+            raise
+        with self._lock:
+            self._connecting -= 1
+            self._created[id(conn)] = now
+            self.stats['connects'] += 1
+            self.stats['connect_seconds'] += now - started
+        logger.info(f"Connected to database in {(now - started) * 1000:.0f} ms")
+        return conn
+
+    def _healthy(self, conn, created: float, now: float) -> bool:
+        if conn.closed:
+            return False
+        if now - created > DB_MAX_LIFETIME:
+            logger.info("Recycling database connection past DB_MAX_LIFETIME")
+            return False
+        if now - self._returned.get(id(conn), now) < DB_HEALTH_CHECK_IDLE:
+            return True
+
+        with self._lock:
+            self.stats['health_checks'] += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except DB_ERRORS as e:
+            logger.warning(f"Discarding unhealthy database connection: {str(e).strip()}")
+            return False
+
+    def _discard(self, conn) -> None:
+        with self._lock:
+            self._created.pop(id(conn), None)
+            self._returned.pop(id(conn), None)
+            self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except DB_ERRORS:
+            pass
+
+    def putconn(self, conn) -> None:
+        """归还连接，未结束的事务会被回滚"""
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except DB_ERRORS:
+                pass
+        if conn.closed or self.closed:
+            self._discard(conn)
+            return
+        with self._lock:
+            self._returned[id(conn)] = time.monotonic()
+            self._idle.append(conn)
+
+    def closeall(self) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+        logger.info("Database connection pool closed")
+
+    def summary(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['open'] = len(self._created)
+        stats['avg_connect_ms'] = (
+            stats['connect_seconds'] / stats['connects'] * 1000 if stats['connects'] else None
+        )
+        del stats['connect_seconds']
+        return stats
+
+
+HTTP_HEADERS = {
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'User-Agent': 'sekai-honors-sync',
+}
+
+
+def create_http_session():
+    """创建可在多个文件、来源和服务器之间复用的 HTTP 会话 (连接池 + keep-alive)"""
+    headers = HTTP_HEADERS
+
+    if HTTP2_ENABLED:
+        if httpx is None:
+            logger.warning("HTTP2=1 but httpx is not installed, falling back to requests")
+        else:
+            try:
+                return httpx.Client(
+                    http2=True,
+                    headers=headers,
+                    follow_redirects=True,
+                    limits=httpx.Limits(
+                        max_connections=HTTP_POOL_SIZE,
+                        max_keepalive_connections=HTTP_POOL_SIZE,
+                    ),
+                )
+            except ImportError as e:
+                logger.warning(f"HTTP/2 unavailable ({e}), falling back to requests")
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(headers)
+    return session
+
+
+def create_async_http_client():
+    """创建 asyncio 版本使用的 httpx.AsyncClient，HTTP2=1 时尽量使用 HTTP/2"""
+    options = {
+        'headers': HTTP_HEADERS,
+        'follow_redirects': True,
+        'limits': httpx.Limits(
+            max_connections=HTTP_POOL_SIZE,
+            max_keepalive_connections=HTTP_POOL_SIZE,
+        ),
+    }
+    if HTTP2_ENABLED:
+        try:
+            return httpx.AsyncClient(http2=True, **options)
+        except ImportError as e:
+            logger.warning(f"HTTP/2 unavailable ({e}), using HTTP/1.1")
+    return httpx.AsyncClient(**options)
 
 
 class HonorsSyncer:
-    def __init__(self, database_url: str, server: str):
+    def __init__(self, database_url: str, server: str, session=None,
+                 health: Optional[SourceHealth] = None, pool: Optional[ConnectionPool] = None):
         self.server = server
         self.repo = SERVERS.get(server)
         if not self.repo:
             raise ValueError(f"Unknown server: {server}")
         
-        self.conn = psycopg2.connect(database_url, sslmode='require')
-        self.conn.autocommit = False
-        logger.info(f"Connected to database for server: {server} ({SERVER_NAMES.get(server)})")
+        # 数据库连接延迟到确实需要写入时才从连接池取出，写完归还；连接池可在多个实例间共享
+        self.conn = None
+        self._owns_pool = pool is None
+        self.pool = pool if pool is not None else ConnectionPool(database_url, maxconn=1)
+
+        # 未传入共享会话时自行创建，close() 时一并关闭
+        self._owns_session = session is None
+        self.session = session if session is not None else create_http_session()
+        self._hedge_pool = self._create_hedge_pool()
+
+        # 来源健康状况可在多个实例间共享
+        if health is None:
+            health = SourceHealth(os.path.join(CACHE_DIR, 'sources.json') if CACHE_DIR else None)
+        self.health = health
+
+        cache_path = os.path.join(CACHE_DIR, f'http-{server}.json') if CACHE_DIR else None
+        self.validators = ValidatorCache(cache_path)
+        self._force = False
+        # 下载使用的提交 SHA 或分支
+        self._ref = DEFAULT_REF
+
+        # 上次成功同步时的上游提交 SHA
+        self.state_path = os.path.join(CACHE_DIR, f'state-{server}.json') if CACHE_DIR else None
+        self.state = _load_json_file(self.state_path)
+        self.not_modified = []
+        # 各表本次写入的 inserted / updated / unchanged 计数，以及 diff 策略下的变更集
+        self.write_stats = {}
+        self.changesets = {}
+        # swap 策略下已加载、等待提交前替换的 (表, 分区, 影子表)
+        self._pending_swaps = []
+
+        # 单次运行内的下载缓存: filename -> {'data': MasterData | NOT_MODIFIED}
+        self._fetch_cache = {}
+        self.fetch_hits = 0
+        self.fetch_misses = 0
+        self._fetch_lock = threading.Lock()
     
+    def connect(self):
+        if self.conn is None or self.conn.closed:
+            if self.conn is not None:
+                self.pool.putconn(self.conn)
+            self.conn = self.pool.getconn()
+        return self.conn
+
+    def release(self) -> None:
+        """把数据库连接归还连接池"""
+        if self.conn is not None:
+            self.pool.putconn(self.conn)
+            self.conn = None
+
+    def _create_hedge_pool(self) -> Optional[ThreadPoolExecutor]:
+        """对冲下载使用的线程池 (每个文件的每个来源各一个线程)"""
+        return ThreadPoolExecutor(max_workers=len(MASTERDATA_FILES) * len(SOURCES))
+
     def close(self):
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed")
+        self.release()
+        if self._owns_pool:
+            self.pool.closeall()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        if self._owns_session:
+            self.session.close()
     
-    def fetch_json(self, filename: str) -> Optional[list]:
-        """从 GitHub 获取 JSON 数据"""
-        urls = [
-            RAW_URL_TEMPLATE.format(repo=self.repo, file=filename),
-            CDN_URL_TEMPLATE.format(repo=self.repo, file=filename),
-        ]
-        
-        for url in urls:
+    def fetch_json(self, filename: str, conditional: bool = True):
+        """从 GitHub 获取 JSON 数据
+
+        conditional 为 True 时携带上次的 ETag / Last-Modified，
+        上游未变化则返回 NOT_MODIFIED；全部来源失败返回 None。
+        同一次运行内每个文件只下载、解析一次。
+        """
+        conditional = conditional and not self._force
+        cached = self._cached(filename, conditional)
+        if cached is not None:
+            return cached['data']
+
+        data = self._download(filename, conditional)
+        self._store(filename, data)
+        return data
+
+    def _cached(self, filename: str, conditional: bool) -> Optional[dict]:
+        """查找本次运行的下载缓存并计数；无条件请求不能使用缓存的 NOT_MODIFIED"""
+        with self._fetch_lock:
+            cached = self._fetch_cache.get(filename)
+            if cached and (conditional or cached['data'] is not NOT_MODIFIED):
+                self.fetch_hits += 1
+                return cached
+            self.fetch_misses += 1
+        return None
+
+    def _store(self, filename: str, data) -> None:
+        if data is None:
+            return
+        with self._fetch_lock:
+            previous = self._fetch_cache.get(filename)
+            self._fetch_cache[filename] = {'data': data}
+        if previous and isinstance(previous['data'], MasterData):
+            previous['data'].close()
+
+    def probe_upstream_sha(self) -> Optional[str]:
+        """用一次轻量请求获取上游仓库当前的提交 SHA，失败时返回 None"""
+        url, headers = self._sha_probe_request()
+        try:
+            resp = self.session.get(url, headers=headers, timeout=SHA_PROBE_TIMEOUT)
+            resp.raise_for_status()
+            return self._parse_sha(resp.text)
+        except (HTTP_ERRORS + (ValueError,)) as e:
+            logger.warning(f"Failed to probe upstream SHA from {url}: {e}")
+            return None
+
+    def _sha_probe_request(self) -> tuple:
+        url = SHA_PROBE_URL_TEMPLATE.format(repo=self.repo, server=self.server)
+        headers = {'Accept': 'application/vnd.github.sha'}
+        token = os.environ.get('GITHUB_TOKEN')
+        if token and url.startswith('https://api.github.com/'):
+            headers['Authorization'] = f'Bearer {token}'
+        return url, headers
+
+    @staticmethod
+    def _parse_sha(text: str) -> Optional[str]:
+        text = text.strip()
+        sha = json.loads(text).get('sha') if text.startswith('{') else text
+        # SHA 会拼进下载 URL，只接受十六进制字符串
+        if sha and not re.fullmatch(r'[0-9a-fA-F]{7,64}', sha):
+            raise ValueError(f"Unexpected SHA: {sha[:80]!r}")
+        return sha or None
+
+    def prefetch(self) -> None:
+        """在写库之前并发下载全部 masterdata 文件到本次运行的缓存中"""
+        with ThreadPoolExecutor(max_workers=len(MASTERDATA_FILES)) as pool:
+            results = dict(zip(MASTERDATA_FILES, pool.map(self.fetch_json, MASTERDATA_FILES)))
+        for filename in self._dependencies_to_refetch(results):
+            self.fetch_json(filename, conditional=False)
+
+    @staticmethod
+    def _dependencies_to_refetch(results: dict) -> list:
+        """有 Lookup 关联的两个文件任意一方有变化时另一方也需要完整内容，返回需要无条件重新下载的文件"""
+        def changed(filename):
+            return results.get(filename) not in (None, NOT_MODIFIED)
+
+        refetch = []
+        for spec in TABLE_SPECS:
+            for dependency in spec.dependencies:
+                if changed(spec.source) and results.get(dependency) is NOT_MODIFIED:
+                    refetch.append(dependency)
+                elif changed(dependency) and results.get(spec.source) is NOT_MODIFIED:
+                    refetch.append(spec.source)
+        return list(dict.fromkeys(refetch))
+
+    def _ranked_sources(self, filename: str) -> tuple:
+        """返回 (按健康状况排序的全部来源, 其中未熔断的来源)"""
+        sources = self.health.rank([
+            (name, template.format(repo=self.repo, ref=self._ref, file=filename))
+            for name, template in SOURCES
+        ])
+        # 熔断中的来源只作为最后的备选，不参与对冲
+        healthy = [item for item in sources if not self.health.is_open(item[0])]
+        if healthy and len(healthy) < len(sources):
+            logger.info(f"Skipping sources with open circuit: "
+                        f"{', '.join(name for name, _ in sources if self.health.is_open(name))}")
+        return sources, healthy
+
+    def _can_hedge(self, healthy: list) -> bool:
+        """只有 URL 固定到提交 SHA 时才对冲
+
+        分支 URL 下 CDN 经常返回旧内容，此时只在首选来源失败后才回退，不因其响应慢而采用 CDN。
+        """
+        return HEDGE_ENABLED and self._ref != DEFAULT_REF and len(healthy) > 1
+
+    def _download(self, filename: str, conditional: bool):
+        """从各来源下载，返回 MasterData / NOT_MODIFIED / None"""
+        sources, healthy = self._ranked_sources(filename)
+        if self._can_hedge(healthy):
+            result = self._download_hedged(filename, healthy, conditional)
+        else:
+            result = self._download_sequential(filename, healthy or sources, conditional)
+        if result is None and healthy and len(healthy) < len(sources):
+            result = self._download_sequential(filename, sources[len(healthy):], conditional)
+        return self._accept_download(filename, result)
+
+    def _accept_download(self, filename: str, result):
+        """记录最终采用的响应的校验值，返回 MasterData / NOT_MODIFIED / None"""
+        if result is None:
+            logger.error(f"All sources failed for {filename}")
+            return None
+
+        data, cache_key, resp = result
+        self.validators.update(cache_key, resp)
+        if data is NOT_MODIFIED:
+            logger.info(f"{filename} not modified since last sync")
+        elif data.streaming:
+            logger.info(f"Fetched {data.size} bytes from {filename} (sha256 {data.sha256[:12]})")
+        else:
+            logger.info(f"Fetched {len(data)} records from {filename} (sha256 {data.sha256[:12]})")
+        return data
+
+    def _download_sequential(self, filename: str, sources: list, conditional: bool):
+        """依次尝试各来源"""
+        for source, url in sources:
             try:
-                logger.info(f"Fetching {filename} from {url}")
-                resp = requests.get(url, timeout=30)
-                resp.raise_for_status()
-                data = resp.json()
-                logger.info(f"Fetched {len(data)} records from {filename}")
-                return data
-            except requests.RequestException as e:
+                return self._fetch_from(filename, source, url, conditional)
+            except HTTP_ERRORS as e:
                 logger.warning(f"Failed to fetch from {url}: {e}")
-                continue
-            except json.JSONDecodeError as e:
+                self.health.record_failure(source, e)
+            except ValueError as e:
                 logger.error(f"Invalid JSON from {url}: {e}")
+                self.health.record_failure(source, e)
+        return None
+
+    def _download_hedged(self, filename: str, sources: list, conditional: bool):
+        """对冲请求: 首选来源超过自适应延迟仍无响应时追加下一个来源，取先成功者"""
+        cancel = threading.Event()
+        remaining = list(sources)
+        pending = {}
+
+        def launch():
+            source, url = remaining.pop(0)
+            future = self._hedge_pool.submit(
+                self._fetch_from, filename, source, url, conditional, cancel
+            )
+            pending[future] = (source, url)
+
+        delay = self._hedge_delay(sources[0][0])
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=delay if remaining else None, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info(f"No response for {filename} within {delay:.2f}s, hedging with {remaining[0][1]}")
+                launch()
                 continue
-        
-        logger.error(f"All sources failed for {filename}")
+
+            for future in done:
+                source, url = pending.pop(future)
+                try:
+                    result = future.result()
+                except FetchCancelled:
+                    continue
+                except HTTP_ERRORS as e:
+                    logger.warning(f"Failed to fetch from {url}: {e}")
+                    self.health.record_failure(source, e)
+                except ValueError as e:
+                    logger.error(f"Invalid JSON from {url}: {e}")
+                    self.health.record_failure(source, e)
+                else:
+                    # 通知仍在进行的请求放弃读取响应体；已越过取消检查的落败请求完成后释放其临时文件
+                    cancel.set()
+                    for other in pending:
+                        other.add_done_callback(_close_late_result)
+                    return result
+
+            if not pending and remaining:
+                launch()
+
         return None
+
+    def _fetch_from(self, filename: str, source: str, url: str, conditional: bool,
+                    cancel: Optional[threading.Event] = None):
+        """从单个来源下载，返回 (data, cache_key, resp)
+
+        失败时抛出 HTTP_ERRORS / ValueError；对冲落败时抛出 FetchCancelled。
+        校验值由调用方只对最终采用的响应写入。
+        流式模式下 JSON 的有效性要到写库时才能发现，此时由事务回滚兜底。
+        """
+        cache_key = ValidatorCache.key(self.server, filename, source)
+        headers = self.validators.request_headers(cache_key) if conditional else {}
+
+        logger.info(f"Fetching {filename} from {url}")
+        started = time.monotonic()
+        resp = self._open(url, headers)
+        try:
+            latency = time.monotonic() - started
+            if cancel is not None and cancel.is_set():
+                # 落败的请求同样记录延迟，否则慢但不失败的来源在排序中永远不会靠后
+                self.health.record_latency(source, latency)
+                raise FetchCancelled(url)
+            if resp.status_code == 304:
+                self.health.record_success(source, latency)
+                return NOT_MODIFIED, cache_key, resp
+            resp.raise_for_status()
+
+            spool = _Spool()
+            try:
+                for chunk in _iter_body(resp):
+                    spool.write(chunk)
+            except BaseException:
+                spool.file.close()
+                raise
+        finally:
+            resp.close()
+
+        data = spool.masterdata(filename)
+        try:
+            if cancel is not None and cancel.is_set():
+                self.health.record_latency(source, latency)
+                raise FetchCancelled(url)
+            data.load()
+        except BaseException:
+            data.close()
+            raise
+        self.health.record_success(source, latency)
+        return data, cache_key, resp
+
+    def _open(self, url: str, headers: dict):
+        """发起流式 GET 请求，只等待响应头"""
+        if httpx is not None and isinstance(self.session, httpx.Client):
+            request = self.session.build_request('GET', url, headers=headers, timeout=HTTP_TIMEOUT)
+            return self.session.send(request, stream=True)
+        return self.session.get(url, headers=headers, timeout=HTTP_TIMEOUT, stream=True)
+
+    def _hedge_delay(self, source: str) -> float:
+        """根据来源近期的 p95 响应延迟决定何时发起对冲请求"""
+        if len(self.health.stats.get(source, {}).get('latencies', [])) < 5:
+            return HEDGE_DELAY
+        p95 = self.health.percentile(source, 0.95)
+        return min(max(p95, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
     
-    def sync_honors(self) -> int:
-        """同步普通徽章 (包含 group_name 和 group_type)"""
-        # Fetch groups for name and type resolution
-        groups_data = self.fetch_json('honorGroups.json')
-        group_map = {}
-        if groups_data:
-            for g in groups_data:
-                # 存储整个对象以便后续提取
-                group_map[g.get('id')] = g
-
-        data = self.fetch_json('honors.json')
+    def sync_table(self, spec: TableSpec) -> int:
+        """按 TableSpec 同步一张表，返回记录数"""
+        # 被关联的文件有变化时，关联列可能随之变化，必须重新拉取本文件
+        dependencies = {source: self.fetch_json(source) for source in spec.dependencies}
+        data = self.fetch_json(
+            spec.source,
+            conditional=all(d is NOT_MODIFIED for d in dependencies.values()),
+        )
+        # 下载失败不能当作空数据处理，整个事务回滚且不记录 SHA，下次运行重试
+        for source, fetched in [(spec.source, data)] + list(dependencies.items()):
+            if fetched is None:
+                raise RuntimeError(f"Failed to fetch {source} from all sources")
+        if data is NOT_MODIFIED:
+            self.not_modified.append(spec.source)
+            return 0
         if not data:
             return 0
-        
-        records = []
-        for item in data:
-            group_id = item.get('groupId')
-            group_name = None
-            group_type = None  # 新增变量
-            
-            # 从 map 中提取 name 和 honorType
-            if group_id in group_map:
-                group_info = group_map[group_id]
-                group_name = group_info.get('name')
-                group_type = group_info.get('honorType') # 提取 honorType
-
-            records.append((
-                self.server,
-                item.get('id'),
-                item.get('seq'),
-                group_id,
-                group_name,      # 写入 group_name
-                group_type,      # 写入 group_type (新增)
-                item.get('honorRarity'),
-                item.get('name'),
-                item.get('assetbundleName'),
-                Json(item.get('levels', [])),
-            ))
-        
-        # 更新 SQL 语句，加入 group_type
-        sql = """
-            INSERT INTO honors (
-                server, honor_id, seq, group_id, 
-                group_name, group_type,  -- 新增列名
-                honor_rarity, name, asset_bundle_name, levels, updated_at
-            ) VALUES %s
-            ON CONFLICT (server, honor_id) DO UPDATE SET
-                seq = EXCLUDED.seq,
-                group_id = EXCLUDED.group_id,
-                group_name = EXCLUDED.group_name,
-                group_type = EXCLUDED.group_type, -- 更新冲突处理
-                honor_rarity = EXCLUDED.honor_rarity,
-                name = EXCLUDED.name,
-                asset_bundle_name = EXCLUDED.asset_bundle_name,
-                levels = EXCLUDED.levels,
-                updated_at = CURRENT_TIMESTAMP
+
+        indexes = {}
+        for source, dependency in dependencies.items():
+            if dependency is NOT_MODIFIED:
+                dependency = self.fetch_json(source, conditional=False)
+                if dependency is None:
+                    raise RuntimeError(f"Failed to fetch {source} from all sources")
+            indexes[source] = {item.id: item for item in dependency} if dependency else {}
+
+        get_key = attrgetter(spec.key[1])
+        getters = []
+        for _, field in spec.fields:
+            if isinstance(field, Lookup):
+                getters.append(self._lookup_getter(field, indexes[field.source]))
+            else:
+                getters.append(attrgetter(field))
+
+        def rows():
+            server = self.server
+            for item in data:
+                yield (server, get_key(item)) + tuple(get(item) for get in getters)
+
+        stats = self._sync_table(
+            spec.table,
+            ('server', spec.key[0]) + tuple(column for column, _ in spec.fields),
+            key=('server', spec.key[0]),
+            rows=rows(),
+            jsonb=spec.jsonb,
+            partition=self._ensure_partition(spec.table) if spec.partitioned else None,
+        )
+        self._log_synced(spec.table, stats)
+
+        for child in spec.children:
+            self._sync_child(spec, child, data, get_key)
+        return stats['total']
+
+    def _sync_child(self, spec: TableSpec, child: ChildSpec, data, get_parent_key) -> None:
+        """把 data 中各记录的嵌套列表同步到子表，变化检测与删除处理与父表相同"""
+        get_entries = attrgetter(child.attr)
+        get_child_key = itemgetter(child.key[1])
+        json_keys = tuple(json_key for _, json_key in child.fields)
+
+        def rows():
+            server = self.server
+            for item in data:
+                parent_id = get_parent_key(item)
+                for entry in get_entries(item) or ():
+                    yield (server, parent_id, get_child_key(entry)) + tuple(entry.get(k) for k in json_keys)
+
+        key = ('server', spec.key[0], child.key[0])
+        stats = self._sync_table(
+            child.table,
+            key + tuple(column for column, _ in child.fields),
+            key=key,
+            rows=rows(),
+            jsonb=child.jsonb,
+            partition=self._ensure_partition(child.table) if child.partitioned else None,
+        )
+        self._log_synced(child.table, stats)
+
+    def _log_synced(self, table: str, stats: dict) -> None:
+        logger.info(f"Synced {stats['total']} {table.replace('_', ' ')} for {self.server} "
+                    f"({stats['inserted']} inserted, {stats['updated']} updated, "
+                    f"{stats['unchanged']} unchanged, {stats['deleted']} deleted)")
+
+    @staticmethod
+    def _lookup_getter(lookup: Lookup, index: dict):
+        get_on = attrgetter(lookup.on)
+        get_attr = attrgetter(lookup.attr)
+
+        def get(item):
+            related = index.get(get_on(item))
+            return get_attr(related) if related is not None else None
+        return get
+
+    def _ensure_partition(self, table: str) -> str:
+        """返回该服务器在分区表 table 中的分区名，分区不存在时创建"""
+        partition = f"{table}_{self.server}"
+        with self.conn.cursor() as cur:
+            # 先检查是否存在，避免 CREATE TABLE ... PARTITION OF 对父表加锁
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (partition,))
+            if not cur.fetchone()[0]:
+                # DDL 不能使用参数；server 已在构造时按 SERVERS 校验
+                cur.execute(
+                    f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} "
+                    f"FOR VALUES IN ('{self.server}')"
+                )
+                logger.info(f"Created partition {partition}")
+        return partition
+
+    def _sync_table(self, table: str, columns: tuple, key: tuple, rows, jsonb: tuple = (),
+                    partition: Optional[str] = None) -> dict:
+        """把 rows 同步到 table，返回 {'total', 'inserted', 'updated', 'unchanged'} 计数
+
+        rows 中各值与 columns 一一对应，jsonb 列为未序列化的 Python 对象。
+        每行追加 content_hash 列 (除主键外各列的内容哈希)，变化检测只比较哈希。
+        diff 策略下只把新增与变化的行交给 _upsert，并记录结构化的变更集。
+        最后按 DELETE_MODE 处理上游已不存在的行。
+        给出 partition 时读写都直接针对该分区；swap 策略下加载影子表，提交前整体替换该分区。
         """
-        
+        payload_indexes = [i for i, col in enumerate(columns) if col not in key]
+        hashed_columns = columns + ('content_hash',)
+        id_indexes = [columns.index(col) for col in key[1:]]
+        fetched_ids = []
+        target = partition or table
+
+        def hashed_rows():
+            for row in rows:
+                fetched_ids.append(tuple(row[i] for i in id_indexes))
+                yield tuple(row) + (content_hash(row[i] for i in payload_indexes),)
+
+        if SYNC_STRATEGY == 'swap' and partition:
+            stats = self._load_shadow(table, partition, hashed_columns, key, hashed_rows(), jsonb)
+            self.write_stats[table] = stats
+            return stats
+        if SYNC_STRATEGY != 'diff':
+            stats = self._upsert(target, hashed_columns, key, hashed_rows(), jsonb)
+        else:
+            changeset = self._diff(target, hashed_columns, key, hashed_rows(), jsonb)
+            self.changesets[table] = changeset
+            total = changeset.pop('total')
+            stats = {
+                'total': total,
+                'inserted': len(changeset['added']),
+                'updated': len(changeset['changed']),
+                'unchanged': total - len(changeset['added']) - len(changeset['changed']),
+            }
+
+        stats['deleted'] = 0
+        if DELETE_MODE in ('soft', 'hard') and fetched_ids:
+            stats['deleted'] = self._delete_missing(target, key[1:], fetched_ids)
+
+        self.write_stats[table] = stats
+        return stats
+
+    def _delete_missing(self, table: str, id_columns: tuple, ids: list) -> int:
+        """软删除或硬删除上游已不存在的行，返回受影响的行数
+
+        ids 为获取到的各行主键 (不含 server) 的元组，与之做反连接，每张表只执行一条集合语句；
+        待删除比例超过 DELETE_MAX_RATIO 时抛出 DeletionThresholdExceeded，整个事务回滚。
+        """
+        params = {'server': self.server}
+        params.update({f'ids{i}': list(column) for i, column in enumerate(zip(*ids))})
+        arrays = ', '.join(f'%(ids{i})s::int[]' for i in range(len(id_columns)))
+        aliases = ', '.join(f'id{i}' for i in range(len(id_columns)))
+        matches = ' AND '.join(f'fetched.id{i} = {table}.{col}' for i, col in enumerate(id_columns))
+        missing = f"""NOT EXISTS (
+            SELECT 1 FROM unnest({arrays}) AS fetched({aliases})
+            WHERE {matches}
+        )"""
+        # 软删除时已删除的行不再计入
+        scope = '' if DELETE_MODE == 'hard' else 'AND deleted_at IS NULL'
+
         with self.conn.cursor() as cur:
-            # 注意 template 中的 %s 数量增加了 1 个 (总共 11 个占位符)
-            execute_values(
-                cur, sql, records,
-                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)"
-            )
-        
-        logger.info(f"Synced {len(records)} honors for {self.server}")
-        return len(records)
-    
-    def sync_bonds_honors(self) -> int:
-        """同步羁绊徽章"""
-        data = self.fetch_json('bondsHonors.json')
-        if not data:
-            return 0
-        
-        records = []
-        for item in data:
-            records.append((
-                self.server,
-                item.get('id'),
-                item.get('seq'),
-                item.get('bondsGroupId'),
-                item.get('gameCharacterUnitId1'),
-                item.get('gameCharacterUnitId2'),
-                item.get('honorRarity'),
-                item.get('name'),
-                item.get('description'),
-                Json(item.get('levels', [])),
-            ))
-        
-        sql = """
-            INSERT INTO bonds_honors (
-                server, bonds_honor_id, seq, bonds_group_id,
-                game_character_unit_id1, game_character_unit_id2,
-                honor_rarity, name, description, levels, updated_at
-            ) VALUES %s
-            ON CONFLICT (server, bonds_honor_id) DO UPDATE SET
-                seq = EXCLUDED.seq,
-                bonds_group_id = EXCLUDED.bonds_group_id,
-                game_character_unit_id1 = EXCLUDED.game_character_unit_id1,
-                game_character_unit_id2 = EXCLUDED.game_character_unit_id2,
-                honor_rarity = EXCLUDED.honor_rarity,
-                name = EXCLUDED.name,
-                description = EXCLUDED.description,
-                levels = EXCLUDED.levels,
-                updated_at = CURRENT_TIMESTAMP
+            cur.execute(f"""
+                SELECT count(*) FILTER (WHERE {missing}), count(*)
+                FROM {table} WHERE server = %(server)s {scope}
+            """, params)
+            doomed, existing = cur.fetchone()
+            if not doomed:
+                return 0
+            if doomed > existing * DELETE_MAX_RATIO:
+                raise DeletionThresholdExceeded(
+                    f"{doomed} of {existing} rows in {table} would be removed, "
+                    f"exceeding DELETE_MAX_RATIO={DELETE_MAX_RATIO}"
+                )
+
+            if DELETE_MODE == 'hard':
+                cur.execute(f"DELETE FROM {table} WHERE server = %(server)s AND {missing}", params)
+            else:
+                cur.execute(f"""
+                    UPDATE {table} SET deleted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                    WHERE server = %(server)s {scope} AND {missing}
+                """, params)
+            deleted = cur.rowcount
+
+        logger.info(f"{'Deleted' if DELETE_MODE == 'hard' else 'Soft-deleted'} "
+                    f"{deleted} rows from {table} for {self.server}")
+        return deleted
+
+    def _load_shadow(self, table: str, partition: str, columns: tuple, key: tuple, rows,
+                     jsonb: tuple) -> dict:
+        """把该服务器的全部数据加载到影子表 <分区名>_new，替换留到提交前由 _swap_shadows 完成
+
+        影子表先不建索引，COPY 与合并完成后再建索引并 ANALYZE；加载期间只读取旧分区，
+        不持有其行锁。保留已有行的 id / created_at，内容未变化的行保留 updated_at；
+        上游已不存在的行按 DELETE_MODE 处理，同样受 DELETE_MAX_RATIO 限制。
+        影子表行数与获取到的记录数不符时抛出 RowCountMismatch。
+        返回 {'total', 'inserted', 'updated', 'unchanged', 'deleted'} 计数。
         """
-        
+        shadow = f"{partition}_new"
+        stage = f"_stage_{partition}"
+        column_list = ', '.join(columns)
+        join = ' AND '.join(f"o.{col} = s.{col}" for col in key)
+        missing = f"NOT EXISTS (SELECT 1 FROM {stage} s WHERE {join})"
+        # 软删除时已删除的行不再计入
+        scope = '' if DELETE_MODE == 'hard' else 'AND o.deleted_at IS NULL'
+        jsonb_indexes = {i for i, col in enumerate(columns) if col in jsonb}
+
+        with self.conn.cursor() as cur:
+            # 影子表 LIKE 父表时持有父表的共享锁直到提交，提交前的 DETACH 又需要父表的排他锁；
+            # 多个服务器同时 swap 会互相等待而死锁，因此在事务内串行化 (锁随提交 / 回滚释放)
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('sekai-honors-sync swap'))")
+            cur.execute(f"""
+                CREATE TEMP TABLE {stage} ON COMMIT DROP AS
+                SELECT {column_list} FROM {partition} WITH NO DATA
+            """)
+            total = self._copy_into(cur, stage, columns, rows, jsonb_indexes)
+
+            cur.execute(f"""
+                SELECT count(*) FILTER (WHERE o.{key[1]} IS NULL),
+                       count(*) FILTER (WHERE o.{key[1]} IS NOT NULL
+                           AND (o.content_hash IS DISTINCT FROM s.content_hash OR o.deleted_at IS NOT NULL))
+                FROM {stage} s LEFT JOIN {partition} o ON {join}
+            """)
+            inserted, updated = cur.fetchone()
+            deleted = 0
+            if DELETE_MODE in ('soft', 'hard') and total:
+                cur.execute(f"""
+                    SELECT count(*) FILTER (WHERE {missing}), count(*)
+                    FROM {partition} o WHERE TRUE {scope}
+                """)
+                deleted, existing = cur.fetchone()
+                if deleted > existing * DELETE_MAX_RATIO:
+                    raise DeletionThresholdExceeded(
+                        f"{deleted} of {existing} rows in {partition} would be removed, "
+                        f"exceeding DELETE_MAX_RATIO={DELETE_MAX_RATIO}"
+                    )
+
+            # 与父表结构、默认值 (共用 id 序列) 一致、暂不带索引的影子表；
+            # 与分区约束相同的 CHECK 使 ATTACH 无需扫描全表校验
+            cur.execute(f"DROP TABLE IF EXISTS {shadow}")
+            cur.execute(f"CREATE TABLE {shadow} (LIKE {table} INCLUDING DEFAULTS INCLUDING STORAGE)")
+            cur.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {shadow}_server CHECK (server = '{self.server}')")
+            cur.execute(f"""
+                INSERT INTO {shadow} ({column_list}, id, deleted_at, created_at, updated_at)
+                SELECT {', '.join(f's.{col}' for col in columns)},
+                       COALESCE(o.id, nextval(pg_get_serial_sequence('{table}', 'id'))),
+                       NULL,
+                       COALESCE(o.created_at, CURRENT_TIMESTAMP),
+                       CASE WHEN o.content_hash = s.content_hash AND o.deleted_at IS NULL
+                            THEN o.updated_at ELSE CURRENT_TIMESTAMP END
+                FROM {stage} s LEFT JOIN {partition} o ON {join}
+            """)
+            carried = carried_live = 0
+            if DELETE_MODE != 'hard':
+                # 上游已不存在的行保留下来；soft 时标记删除
+                deleted_at = 'o.deleted_at' if DELETE_MODE == 'off' else 'COALESCE(o.deleted_at, CURRENT_TIMESTAMP)'
+                updated_at = 'o.updated_at' if DELETE_MODE == 'off' else (
+                    'CASE WHEN o.deleted_at IS NULL THEN CURRENT_TIMESTAMP ELSE o.updated_at END')
+                cur.execute(f"""
+                    WITH carried AS (
+                        INSERT INTO {shadow} ({column_list}, id, deleted_at, created_at, updated_at)
+                        SELECT {', '.join(f'o.{col}' for col in columns)},
+                               o.id, {deleted_at}, o.created_at, {updated_at}
+                        FROM {partition} o WHERE {missing}
+                        RETURNING deleted_at
+                    )
+                    SELECT count(*), count(*) FILTER (WHERE deleted_at IS NULL) FROM carried
+                """)
+                carried, carried_live = cur.fetchone()
+            cur.execute(f"DROP TABLE {stage}")
+
+            # off 时保留下来的行仍是未删除状态，计入 live
+            cur.execute(f"SELECT count(*) FILTER (WHERE deleted_at IS NULL), count(*) FROM {shadow}")
+            live, loaded = cur.fetchone()
+            if live != total + carried_live or loaded - live != carried - carried_live:
+                raise RowCountMismatch(
+                    f"{shadow} has {live} live / {loaded - live} deleted rows, "
+                    f"expected {total + carried_live} live / {carried - carried_live} deleted"
+                )
+
+            # 数据加载完成后再建索引：主键等约束按父表的定义添加，其余索引改写父表的索引定义
+            cur.execute("""
+                SELECT pg_get_constraintdef(oid) FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype IN ('p', 'u')
+            """, (table,))
+            for (definition,) in cur.fetchall():
+                cur.execute(f"ALTER TABLE {shadow} ADD {definition}")
+            cur.execute("""
+                SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+                WHERE i.indrelid = %s::regclass
+                    AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+            """, (table,))
+            for (definition,) in cur.fetchall():
+                cur.execute(_INDEX_TARGET.sub(rf'CREATE \1INDEX ON {shadow} ', definition, count=1))
+            cur.execute(f"ANALYZE {shadow}")
+
+        self._pending_swaps.append((table, partition, shadow))
+        logger.info(f"Loaded {loaded} rows into {shadow}")
+        return {
+            'total': total,
+            'inserted': inserted,
+            'updated': updated,
+            'unchanged': total - inserted - updated,
+            'deleted': deleted,
+        }
+
+    def _swap_shadows(self) -> None:
+        """用 DETACH / ATTACH 把已加载的影子表替换为分区
+
+        在提交前最后执行，父表上的锁只持有到紧接着的提交为止。
+        """
+        with self.conn.cursor() as cur:
+            for table, partition, shadow in self._pending_swaps:
+                cur.execute(f"ALTER TABLE {table} DETACH PARTITION {partition}")
+                cur.execute(f"DROP TABLE {partition}")
+                cur.execute(f"ALTER TABLE {shadow} RENAME TO {partition}")
+                # 自动生成的索引名以影子表名开头，改回与原分区一致的名称
+                cur.execute(
+                    "SELECT indexname FROM pg_indexes "
+                    "WHERE schemaname = current_schema() AND tablename = %s AND indexname LIKE %s",
+                    (partition, shadow.replace('_', r'\_') + '%'),
+                )
+                for (index,) in cur.fetchall():
+                    cur.execute(f"ALTER INDEX {index} RENAME TO {partition}{index[len(shadow):]}")
+                cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES IN ('{self.server}')")
+                cur.execute(f"ALTER TABLE {partition} DROP CONSTRAINT {shadow}_server")
+                logger.info(f"Swapped in partition {partition}")
+        self._pending_swaps = []
+
+    def _diff(self, table: str, columns: tuple, key: tuple, rows, jsonb: tuple) -> dict:
+        """与数据库中该服务器的现有数据比对并写入差异
+
+        先用一条查询读出现有行的 content_hash；之后按 WRITE_BATCH_SIZE 分批比对，
+        只为哈希不同的行读取旧值以生成逐列差异，再 upsert 新增与变化的行。
+        返回 {'added', 'changed', 'removed', 'total'}。
+        """
+        key_indexes = [columns.index(col) for col in key]
+        hash_index = columns.index('content_hash')
+
         with self.conn.cursor() as cur:
-            execute_values(
-                cur, sql, records,
-                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)"
+            cur.execute(
+                f"SELECT {', '.join(key)}, content_hash, deleted_at IS NOT NULL "
+                f"FROM {table} WHERE server = %s",
+                (self.server,),
             )
-        
-        logger.info(f"Synced {len(records)} bonds honors for {self.server}")
-        return len(records)
-    
-    def sync_honor_groups(self) -> int:
-        """同步徽章分组"""
-        data = self.fetch_json('honorGroups.json')
-        if not data:
-            return 0
-        
-        records = []
-        for item in data:
-            records.append((
-                self.server,
-                item.get('id'),
-                item.get('name'),
-                item.get('honorType'),
-                item.get('backgroundAssetbundleName'),
-            ))
-        
-        sql = """
-            INSERT INTO honor_groups (
-                server, group_id, name, honor_type,
-                background_asset_bundle_name, updated_at
-            ) VALUES %s
-            ON CONFLICT (server, group_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                honor_type = EXCLUDED.honor_type,
-                background_asset_bundle_name = EXCLUDED.background_asset_bundle_name,
+            # key -> (content_hash, 是否已软删除)
+            current = {tuple(row[:-2]): (row[-2], row[-1]) for row in cur}
+
+        def label(row_key):
+            # 去掉 server 后的主键，单列时直接用其值
+            ident = row_key[1:]
+            return ident[0] if len(ident) == 1 else list(ident)
+
+        changeset = {'added': [], 'changed': [], 'removed': [], 'total': 0}
+        seen = set()
+        for batch in _batched(rows, WRITE_BATCH_SIZE):
+            delta = []
+            changed = {}
+            for row in batch:
+                row_key = tuple(row[i] for i in key_indexes)
+                seen.add(row_key)
+                if row_key not in current:
+                    changeset['added'].append(label(row_key))
+                    delta.append(row)
+                elif current[row_key] != (row[hash_index], False):
+                    # 内容变化，或此前被软删除后又重新出现
+                    changed[row_key] = row
+                    delta.append(row)
+            changeset['total'] += len(batch)
+
+            if changed:
+                with self.conn.cursor() as cur:
+                    if len(key) == 2:
+                        where, ids = f"{key[1]} = ANY(%s)", ([row_key[1] for row_key in changed],)
+                    else:
+                        # 复合主键按列展开为数组再 unnest
+                        where = (f"({', '.join(key[1:])}) IN "
+                                 f"(SELECT * FROM unnest({', '.join(['%s::int[]'] * (len(key) - 1))}))")
+                        ids = tuple(list(column) for column in zip(*(row_key[1:] for row_key in changed)))
+                    cur.execute(
+                        f"SELECT {', '.join(columns)}, deleted_at FROM {table} "
+                        f"WHERE server = %s AND {where}",
+                        (self.server,) + ids,
+                    )
+                    for old in cur:
+                        row_key = tuple(old[i] for i in key_indexes)
+                        new = changed[row_key]
+                        diff = {
+                            col: {'old': old[i], 'new': new[i]}
+                            for i, col in enumerate(columns)
+                            if i not in key_indexes and i != hash_index
+                            and _canonical(old[i]) != _canonical(new[i])
+                        }
+                        if old[-1] is not None:
+                            diff['deleted_at'] = {'old': old[-1], 'new': None}
+                        changeset['changed'].append({'key': label(row_key), 'columns': diff})
+
+            self._upsert(table, columns, key, delta, jsonb)
+
+        changeset['removed'] = [
+            label(row_key) for row_key, (_, deleted) in current.items()
+            if row_key not in seen and not deleted
+        ]
+        return changeset
+
+    def _upsert(self, table: str, columns: tuple, key: tuple, rows, jsonb: tuple = ()) -> dict:
+        """把 rows 按 key upsert 到 table，columns 中须包含 content_hash
+
+        返回 {'total', 'inserted', 'updated', 'unchanged'} 计数。没有数据时不访问数据库。
+        """
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return {'total': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+        rows = itertools.chain([first], rows)
+
+        payload = [col for col in columns if col not in key]
+        updates = ',\n                '.join(f"{col} = EXCLUDED.{col}" for col in payload)
+        # 内容哈希未变化的行不做更新，避免无意义的死元组、WAL 与 updated_at 变化
+        conflict = f"""
+            ON CONFLICT ({', '.join(key)}) DO UPDATE SET
+                {updates},
+                deleted_at = NULL,
                 updated_at = CURRENT_TIMESTAMP
+            WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                OR {table}.deleted_at IS NOT NULL
+            RETURNING (xmax = 0) AS inserted
         """
-        
+        jsonb_indexes = {i for i, col in enumerate(columns) if col in jsonb}
+
+        if LOAD_METHOD == 'copy':
+            total, inserted, updated = self._upsert_copy(table, columns, conflict, rows, jsonb_indexes)
+        elif LOAD_METHOD == 'pipeline':
+            total, inserted, updated = self._upsert_pipeline(table, columns, conflict, rows, jsonb_indexes)
+        else:
+            total, inserted, updated = self._upsert_values(table, columns, conflict, rows, jsonb_indexes)
+
+        return {
+            'total': total,
+            'inserted': inserted,
+            'updated': updated,
+            'unchanged': total - inserted - updated,
+        }
+
+    @staticmethod
+    def _copy_into(cur, table: str, columns: tuple, rows, jsonb_indexes: set) -> int:
+        """把 rows 用 COPY FROM STDIN 写入 table，兼容 psycopg2 与 psycopg 3，返回行数"""
+        stream = _CopyStream(rows, jsonb_indexes)
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        if hasattr(cur, 'copy_expert'):
+            cur.copy_expert(sql, stream)
+        else:
+            with cur.copy(sql) as copy:
+                for chunk in iter(lambda: stream.read(64 * 1024), ''):
+                    copy.write(chunk)
+        return stream.count
+
+    def _upsert_copy(self, table: str, columns: tuple, conflict: str, rows, jsonb_indexes: set) -> tuple:
+        """COPY 到临时表，再用一条 INSERT ... SELECT ... ON CONFLICT 合并"""
+        stage = f"_stage_{table}"
+        column_list = ', '.join(columns)
+
         with self.conn.cursor() as cur:
-            execute_values(
-                cur, sql, records,
-                template="(%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)"
-            )
-        
-        logger.info(f"Synced {len(records)} honor groups for {self.server}")
-        return len(records)
+            cur.execute(f"""
+                CREATE TEMP TABLE {stage} ON COMMIT DROP AS
+                SELECT {column_list} FROM {table} WITH NO DATA
+            """)
+            count = self._copy_into(cur, stage, columns, rows, jsonb_indexes)
+            cur.execute(f"""
+                WITH upserted AS (
+                    INSERT INTO {table} ({column_list}, updated_at)
+                    SELECT {column_list}, CURRENT_TIMESTAMP FROM {stage}
+                    {conflict}
+                )
+                SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+                FROM upserted
+            """)
+            inserted, updated = cur.fetchone()
+            cur.execute(f"DROP TABLE {stage}")
+        return count, inserted, updated
+
+    def _upsert_pipeline(self, table: str, columns: tuple, conflict: str, rows, jsonb_indexes: set) -> tuple:
+        """psycopg 3 管道模式下逐行 executemany
+
+        同一条 INSERT 在服务端预备一次，全部行连续发送、不等待逐批往返，
+        最后统一读取各行的 RETURNING 结果。
+        """
+        sql = f"""
+            INSERT INTO {table} ({', '.join(columns)}, updated_at)
+            VALUES ({', '.join(['%s'] * len(columns))}, CURRENT_TIMESTAMP)
+            {conflict}
+        """
+        count = 0
+
+        def params():
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield tuple(Jsonb(v) if i in jsonb_indexes else v for i, v in enumerate(row))
+
+        inserted = updated = 0
+        with self.conn.pipeline(), self.conn.cursor() as cur:
+            cur.executemany(sql, params(), returning=True)
+            # 每行一个结果集；内容未变化的行没有返回
+            while True:
+                for (is_insert,) in cur.fetchall():
+                    if is_insert:
+                        inserted += 1
+                    else:
+                        updated += 1
+                if not cur.nextset():
+                    break
+        return count, inserted, updated
+
+    def _upsert_values(self, table: str, columns: tuple, conflict: str, rows, jsonb_indexes: set) -> tuple:
+        """按 WRITE_BATCH_SIZE 分批执行 execute_values"""
+        sql = f"""
+            INSERT INTO {table} ({', '.join(columns)}, updated_at) VALUES %s
+            {conflict}
+        """
+        template = f"({', '.join(['%s'] * len(columns))}, CURRENT_TIMESTAMP)"
+
+        count = inserted = updated = 0
+        with self.conn.cursor() as cur:
+            for batch in _batched(rows, WRITE_BATCH_SIZE):
+                batch = [
+                    tuple(Json(v) if i in jsonb_indexes else v for i, v in enumerate(row))
+                    for row in batch
+                ]
+                returned = execute_values(cur, sql, batch, template=template, fetch=True)
+                count += len(batch)
+                inserted += sum(1 for (is_insert,) in returned if is_insert)
+                updated += sum(1 for (is_insert,) in returned if not is_insert)
+        return count, inserted, updated
     
-    def run(self) -> dict:
-        """执行完整同步"""
+    def run(self, force: bool = False) -> dict:
+        """执行完整同步
+
+        上游提交 SHA 与上次成功同步时一致则直接跳过，不连接数据库。
+        force 为 True 时忽略 SHA 与 ETag 缓存。
+        """
+        return self.finish(self.start(force))
+
+    def start(self, force: bool = False) -> dict:
+        """同步的下载阶段: 探测上游 SHA，确认数据库结构后预先下载全部文件，不写库
+
+        返回的 results 交给 finish() 完成写库。
+        """
+        results = self._begin(force)
+        results['upstream_sha'] = self.probe_upstream_sha()
+        self._ref = results['upstream_sha'] or DEFAULT_REF
+        if self._upstream_unchanged(results):
+            return results
+
+        try:
+            # 在下载之前确认数据库结构，避免下载完才在写库时失败
+            self.pool.check_schema()
+            self.prefetch()
+            self._check_downloads()
+        except Exception as e:
+            results['error'] = str(e)
+            logger.error(f"Sync failed for {self.server}: {e}")
+            return results
+
+        self._check_all_not_modified(results)
+        return results
+
+    def _begin(self, force: bool) -> dict:
+        """重置本次运行的状态，返回初始的 results"""
         results = {
             'server': self.server,
             'server_name': SERVER_NAMES.get(self.server),
             'honors': 0,
             'bonds_honors': 0,
             'honor_groups': 0,
+            'not_modified': [],
+            'changes': {},
+            'changesets': {},
+            'sources': {},
+            'pool': {},
+            'upstream_sha': None,
+            'skipped': False,
             'success': False,
             'error': None,
         }
         
+        self.not_modified = []
+        self.write_stats = {}
+        self.changesets = {}
+        self._release_fetch_cache()
+        self.fetch_hits = 0
+        self.fetch_misses = 0
+        self._force = force or FORCE_SYNC
+        return results
+
+    def _upstream_unchanged(self, results: dict) -> bool:
+        """上游 SHA 与上次成功同步时一致则标记为跳过"""
+        sha = results['upstream_sha']
+        if sha and not self._force and sha == self.state.get('sha'):
+            logger.info(f"Upstream {self.repo} unchanged at {sha[:12]}, skipping sync")
+            results['skipped'] = True
+            results['success'] = True
+            return True
+        return False
+
+    def _check_downloads(self) -> None:
+        """有文件从全部来源都下载失败时中止本次同步
+
+        否则会把缺少数据的运行当作成功并记录上游 SHA，之后的运行都会因 SHA 未变化而跳过。
+        """
+        failed = [filename for filename in MASTERDATA_FILES if filename not in self._fetch_cache]
+        if failed:
+            raise RuntimeError(f"Failed to fetch {', '.join(failed)} from all sources")
+
+    def _check_all_not_modified(self, results: dict) -> None:
+        """全部文件都返回 304 时无需写库 (数据库只在下载前检查过结构)"""
+        if all(self._fetch_cache.get(filename, {}).get('data') is NOT_MODIFIED
+               for filename in MASTERDATA_FILES):
+            logger.info(f"All masterdata files for {self.server} not modified, skipping sync")
+            self._save_state(results['upstream_sha'])
+            results['not_modified'] = list(MASTERDATA_FILES)
+            results['skipped'] = True
+            results['success'] = True
+
+    def finish(self, results: dict) -> dict:
+        """同步的写库阶段: 在一个事务中写入三张表并提交，失败则回滚
+
+        跳过的运行不写库，但同样保存来源健康状况并填写 sources / pool 统计。
+        """
+        if not results['skipped']:
+            self._write(results)
+
+        logger.info(f"Fetch cache: {self.fetch_hits} hits, {self.fetch_misses} misses")
+        self._release_fetch_cache()
+        self.health.save()
+        results['sources'] = self.health.summary()
+        results['pool'] = self.pool.summary()
+        return results
+
+    def _write(self, results: dict) -> None:
         try:
-            results['honors'] = self.sync_honors()
-            results['bonds_honors'] = self.sync_bonds_honors()
-            results['honor_groups'] = self.sync_honor_groups()
+            if results['error'] is not None:
+                raise RuntimeError(results['error'])
+            self.connect()
+            self._pending_swaps = []
+            for spec in TABLE_SPECS:
+                results[spec.table] = self.sync_table(spec)
+            self._swap_shadows()
             
             self.conn.commit()
+            self.validators.save()
+            self._save_state(results['upstream_sha'])
+            results['not_modified'] = list(self.not_modified)
+            results['changes'] = dict(self.write_stats)
+            results['changesets'] = dict(self.changesets)
             results['success'] = True
             logger.info(f"Sync completed for {self.server}: "
                        f"{results['honors']} honors, "
@@ -267,12 +2086,465 @@ class HonorsSyncer:
                        f"{results['honor_groups']} honor groups")
         
         except Exception as e:
-            self.conn.rollback()
+            if self.conn and not self.conn.closed:
+                self.conn.rollback()
+            self.validators.discard()
+            if results['error'] is None:
+                results['error'] = str(e)
+                logger.error(f"Sync failed for {self.server}: {e}")
+        
+        self.release()
+
+    def _save_state(self, sha: Optional[str]) -> None:
+        """记录成功同步时的上游 SHA"""
+        if sha:
+            self.state.update({'sha': sha, 'synced_at': datetime.now(timezone.utc).isoformat()})
+            _save_json_file(self.state_path, self.state)
+
+    def _release_fetch_cache(self) -> None:
+        for entry in self._fetch_cache.values():
+            if isinstance(entry['data'], MasterData):
+                entry['data'].close()
+        self._fetch_cache = {}
+
+
+def sync_servers(database_url: str, servers: list, force: bool = False) -> list:
+    """在同一进程内同步多个服务器，返回各服务器的 results
+
+    共享 HTTP 会话、来源健康状况和数据库连接池。下载阶段各服务器并发进行，
+    写库阶段依次执行，每个服务器单独一个事务，某个服务器失败不会回滚其它服务器。
+    """
+    session = create_http_session()
+    health = SourceHealth(os.path.join(CACHE_DIR, 'sources.json') if CACHE_DIR else None)
+    db_pool = ConnectionPool(database_url)
+    syncers = [
+        HonorsSyncer(database_url, server, session=session, health=health, pool=db_pool)
+        for server in servers
+    ]
+    try:
+        with ThreadPoolExecutor(max_workers=len(syncers)) as pool:
+            started = list(pool.map(lambda syncer: syncer.start(force), syncers))
+        return [syncer.finish(results) for syncer, results in zip(syncers, started)]
+    finally:
+        for syncer in syncers:
+            syncer.close()
+        db_pool.closeall()
+        session.close()
+
+
+class AsyncHonorsSyncer(HonorsSyncer):
+    """HonorsSyncer 的 asyncio 版本，可在已有的异步服务中使用
+
+    SHA 探测与下载是基于 httpx.AsyncClient 的协程，同样支持条件请求、对冲与熔断；
+    JSON 解析和写库复用同步版本的代码，通过 asyncio.to_thread 执行，不阻塞事件循环。
+    """
+
+    def __init__(self, database_url: str, server: str, client,
+                 health: Optional[SourceHealth] = None, pool: Optional[ConnectionPool] = None):
+        super().__init__(database_url, server, session=client, health=health, pool=pool)
+
+    def _create_hedge_pool(self) -> None:
+        # 对冲下载由 asyncio 任务完成，不需要线程池
+        return None
+
+    def _sync_only(self, name: str):
+        raise TypeError(f"{type(self).__name__}.{name}() is not supported, use {name}_async() instead")
+
+    def run(self, force: bool = False) -> dict:
+        self._sync_only('run')
+
+    def start(self, force: bool = False) -> dict:
+        self._sync_only('start')
+
+    def probe_upstream_sha(self) -> Optional[str]:
+        self._sync_only('probe_upstream_sha')
+
+    def prefetch(self) -> None:
+        self._sync_only('prefetch')
+
+    async def run_async(self, force: bool = False) -> dict:
+        results = await self.start_async(force)
+        return await asyncio.to_thread(self.finish, results)
+
+    async def start_async(self, force: bool = False) -> dict:
+        """start() 的异步版本"""
+        results = self._begin(force)
+        results['upstream_sha'] = await self.probe_upstream_sha_async()
+        self._ref = results['upstream_sha'] or DEFAULT_REF
+        if self._upstream_unchanged(results):
+            return results
+
+        try:
+            await asyncio.to_thread(self.pool.check_schema)
+            await self.prefetch_async()
+            self._check_downloads()
+        except Exception as e:
             results['error'] = str(e)
             logger.error(f"Sync failed for {self.server}: {e}")
-        
+            return results
+
+        self._check_all_not_modified(results)
         return results
 
+    async def probe_upstream_sha_async(self) -> Optional[str]:
+        url, headers = self._sha_probe_request()
+        try:
+            resp = await self.session.get(url, headers=headers, timeout=SHA_PROBE_TIMEOUT)
+            resp.raise_for_status()
+            return self._parse_sha(resp.text)
+        except (HTTP_ERRORS + (ValueError,)) as e:
+            logger.warning(f"Failed to probe upstream SHA from {url}: {e}")
+            return None
+
+    async def prefetch_async(self) -> None:
+        data = await asyncio.gather(*(self.fetch_json_async(filename) for filename in MASTERDATA_FILES))
+        for filename in self._dependencies_to_refetch(dict(zip(MASTERDATA_FILES, data))):
+            await self.fetch_json_async(filename, conditional=False)
+
+    def fetch_json(self, filename: str, conditional: bool = True):
+        """写库阶段只读取 prefetch_async() 的下载结果，下载失败的文件返回 None"""
+        cached = self._cached(filename, conditional and not self._force)
+        return cached['data'] if cached is not None else None
+
+    async def fetch_json_async(self, filename: str, conditional: bool = True):
+        """fetch_json() 的异步版本"""
+        conditional = conditional and not self._force
+        cached = self._cached(filename, conditional)
+        if cached is not None:
+            return cached['data']
+
+        data = await self._download_async(filename, conditional)
+        self._store(filename, data)
+        return data
+
+    async def _download_async(self, filename: str, conditional: bool):
+        sources, healthy = self._ranked_sources(filename)
+        if self._can_hedge(healthy):
+            result = await self._download_hedged_async(filename, healthy, conditional)
+        else:
+            result = await self._download_sequential_async(filename, healthy or sources, conditional)
+        if result is None and healthy and len(healthy) < len(sources):
+            result = await self._download_sequential_async(filename, sources[len(healthy):], conditional)
+        return self._accept_download(filename, result)
+
+    async def _download_sequential_async(self, filename: str, sources: list, conditional: bool):
+        for source, url in sources:
+            try:
+                return await self._fetch_from_async(filename, source, url, conditional)
+            except HTTP_ERRORS as e:
+                logger.warning(f"Failed to fetch from {url}: {e}")
+                self.health.record_failure(source, e)
+            except ValueError as e:
+                logger.error(f"Invalid JSON from {url}: {e}")
+                self.health.record_failure(source, e)
+        return None
+
+    async def _download_hedged_async(self, filename: str, sources: list, conditional: bool):
+        """对冲请求: 首选来源超过自适应延迟仍无响应时追加下一个来源，取先成功者并取消其余请求"""
+        remaining = list(sources)
+        pending = {}
+
+        def launch():
+            source, url = remaining.pop(0)
+            task = asyncio.ensure_future(self._fetch_from_async(filename, source, url, conditional))
+            pending[task] = (source, url)
+
+        delay = self._hedge_delay(sources[0][0])
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=delay if remaining else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    logger.info(f"No response for {filename} within {delay:.2f}s, hedging with {remaining[0][1]}")
+                    launch()
+                    continue
+
+                for task in done:
+                    source, url = pending.pop(task)
+                    try:
+                        return task.result()
+                    except HTTP_ERRORS as e:
+                        logger.warning(f"Failed to fetch from {url}: {e}")
+                        self.health.record_failure(source, e)
+                    except ValueError as e:
+                        logger.error(f"Invalid JSON from {url}: {e}")
+                        self.health.record_failure(source, e)
+
+                if not pending and remaining:
+                    launch()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            # 同时完成的落败请求也要释放其临时文件
+            for outcome in await asyncio.gather(*pending, return_exceptions=True):
+                if isinstance(outcome, tuple) and isinstance(outcome[0], MasterData):
+                    outcome[0].close()
+
+    async def _fetch_from_async(self, filename: str, source: str, url: str, conditional: bool):
+        """_fetch_from() 的异步版本，返回 (data, cache_key, resp)"""
+        cache_key = ValidatorCache.key(self.server, filename, source)
+        headers = self.validators.request_headers(cache_key) if conditional else {}
+
+        logger.info(f"Fetching {filename} from {url}")
+        started = time.monotonic()
+        latency = None
+        try:
+            async with self.session.stream('GET', url, headers=headers, timeout=HTTP_TIMEOUT) as resp:
+                latency = time.monotonic() - started
+                if resp.status_code == 304:
+                    self.health.record_success(source, latency)
+                    return NOT_MODIFIED, cache_key, resp
+                resp.raise_for_status()
+
+                spool = _Spool()
+                try:
+                    async for chunk in resp.aiter_bytes(64 * 1024):
+                        spool.write(chunk)
+                except BaseException:
+                    spool.file.close()
+                    raise
+        except asyncio.CancelledError:
+            # 对冲落败被取消: 记录响应头延迟，尚未收到响应头时以已等待的时间作为下限
+            self.health.record_latency(source, latency if latency is not None else time.monotonic() - started)
+            raise
+
+        data = spool.masterdata(filename)
+        try:
+            await asyncio.to_thread(data.load)
+        except BaseException:
+            data.close()
+            raise
+        self.health.record_success(source, latency)
+        return data, cache_key, resp
+
+
+async def sync_servers_async(database_url: str, servers: list, force: bool = False) -> list:
+    """在一个事件循环中并发同步多个服务器，返回各服务器的 results
+
+    下载与写库都并发进行：每个服务器写库时从共享的连接池取一个独立连接，单独一个事务。
+    """
+    if httpx is None:
+        raise RuntimeError('ASYNC=1 requires httpx (pip install httpx)')
+
+    client = create_async_http_client()
+    health = SourceHealth(os.path.join(CACHE_DIR, 'sources.json') if CACHE_DIR else None)
+    db_pool = ConnectionPool(database_url, maxconn=max(DB_POOL_SIZE, len(servers)))
+    syncers = [
+        AsyncHonorsSyncer(database_url, server, client, health=health, pool=db_pool)
+        for server in servers
+    ]
+    try:
+        return list(await asyncio.gather(*(syncer.run_async(force) for syncer in syncers)))
+    finally:
+        for syncer in syncers:
+            syncer.close()
+        db_pool.closeall()
+        await client.aclose()
+
+
+class SyncDaemon:
+    """常驻进程: 各服务器的 HonorsSyncer 常驻 (HTTP 会话、数据库连接、校验值缓存)，按间隔轮询
+
+    每次轮询先探测上游 SHA，再发条件请求，只有上游确实变化时才写库。
+    """
+
+    def __init__(self, database_url: str, servers: list):
+        self.session = create_http_session()
+        self.health = SourceHealth(os.path.join(CACHE_DIR, 'sources.json') if CACHE_DIR else None)
+        self.pool = ConnectionPool(database_url)
+        self.syncers = {
+            server: HonorsSyncer(database_url, server, session=self.session,
+                                 health=self.health, pool=self.pool)
+            for server in servers
+        }
+        # 启动后立即同步一次
+        self.next_run = {server: time.monotonic() for server in servers}
+        self._schedule_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.webhook = None
+
+    @staticmethod
+    def interval(server: str) -> float:
+        """带随机抖动的轮询间隔"""
+        base = float(os.environ.get(f'POLL_INTERVAL_{server.upper()}', POLL_INTERVAL))
+        return base * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+    def sync(self, server: str, force: bool = False) -> dict:
+        """同步单个服务器，数据库连接从共享的连接池中取出"""
+        syncer = self.syncers[server]
+        return syncer.finish(syncer.start(force))
+
+    def trigger(self, server: str) -> None:
+        """在 WEBHOOK_DEBOUNCE 秒后同步 server；期间再次触发会重新计时，多次 push 只同步一次"""
+        with self._schedule_lock:
+            self.next_run[server] = time.monotonic() + WEBHOOK_DEBOUNCE
+        self._wake.set()
+
+    def run_forever(self) -> None:
+        if WEBHOOK_PORT:
+            # 监听全部网卡，未签名的请求不能触发同步
+            if not WEBHOOK_SECRET:
+                raise ValueError('WEBHOOK_SECRET is required when WEBHOOK_PORT is set')
+            self.webhook = ThreadingHTTPServer(('', int(WEBHOOK_PORT)), WebhookHandler)
+            self.webhook.sync_daemon = self
+            threading.Thread(target=self.webhook.serve_forever, daemon=True).start()
+            logger.info(f"Listening for webhooks on port {WEBHOOK_PORT}")
+
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._schedule_lock:
+                due = [server for server, at in self.next_run.items() if at <= now]
+            for server in due:
+                try:
+                    results = self.sync(server)
+                    if not results['skipped']:
+                        log_results(results)
+                        log_pool(results['pool'])
+                except Exception as e:
+                    logger.exception(f"Unexpected error while syncing {server}: {e}")
+                with self._schedule_lock:
+                    # 同步期间又收到 webhook 时保留更早的计划时间
+                    if self.next_run[server] <= now:
+                        self.next_run[server] = time.monotonic() + self.interval(server)
+                if self._stop.is_set():
+                    break
+
+            with self._schedule_lock:
+                timeout = max(min(self.next_run.values()) - time.monotonic(), 0)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def stop(self, *_) -> None:
+        logger.info("Stopping sync daemon")
+        self._stop.set()
+        self._wake.set()
+
+    def close(self) -> None:
+        if self.webhook:
+            self.webhook.shutdown()
+            self.webhook.server_close()
+        for syncer in self.syncers.values():
+            syncer.close()
+        self.pool.closeall()
+        self.session.close()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """接收上游 masterdata 仓库的 GitHub push webhook，触发对应服务器的同步"""
+
+    # 仓库名 -> 服务器
+    REPO_SERVERS = {repo: server for server, repo in SERVERS.items()}
+
+    def log_message(self, format, *args):
+        logger.debug(f"Webhook {self.address_string()} {format % args}")
+
+    def _respond(self, status: int, message: str) -> None:
+        body = message.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        expected = 'sha256=' + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not WEBHOOK_SECRET or not hmac.compare_digest(expected, self.headers.get('X-Hub-Signature-256', '')):
+            logger.warning(f"Rejected webhook with invalid signature from {self.address_string()}")
+            return self._respond(401, 'invalid signature')
+
+        event = self.headers.get('X-GitHub-Event', '')
+        if event == 'ping':
+            return self._respond(200, 'pong')
+        if event != 'push':
+            return self._respond(202, f'ignored event {event}')
+
+        try:
+            payload = json.loads(body)
+            repository = payload['repository']
+            if not isinstance(repository, dict):
+                raise TypeError('repository is not an object')
+        except (ValueError, KeyError, TypeError):
+            return self._respond(400, 'invalid payload')
+
+        server = self.REPO_SERVERS.get(repository.get('name'))
+        if server is None or server not in self.server.sync_daemon.syncers:
+            return self._respond(202, f"ignored repository {repository.get('full_name')}")
+
+        # 只关心默认分支的 push
+        branch = repository.get('default_branch')
+        if branch and payload.get('ref') not in (None, f'refs/heads/{branch}'):
+            return self._respond(202, f"ignored ref {payload.get('ref')}")
+
+        logger.info(f"Webhook push to {repository.get('full_name')}, "
+                    f"syncing {server} in {WEBHOOK_DEBOUNCE:g}s")
+        self.server.sync_daemon.trigger(server)
+        return self._respond(202, f'sync scheduled for {server}')
+
+
+def log_results(results: dict) -> None:
+    """输出单个服务器的同步结果"""
+    if not results['success']:
+        logger.error(f"Sync failed for {results['server']}: {results['error']}")
+        return
+
+    logger.info("=" * 50)
+    logger.info("SYNC SUCCESSFUL")
+    logger.info(f"Server: {results['server']} ({results['server_name']})")
+    if results['skipped']:
+        sha = results['upstream_sha']
+        logger.info(f"Upstream unchanged{f' at {sha[:12]}' if sha else ''}, nothing to sync")
+    logger.info(f"Honors: {results['honors']}")
+    logger.info(f"Bonds Honors: {results['bonds_honors']}")
+    logger.info(f"Honor Groups: {results['honor_groups']}")
+    if results['not_modified']:
+        logger.info(f"Not Modified: {', '.join(results['not_modified'])}")
+    for table, stats in results['changes'].items():
+        logger.info(f"Changes in {table}: {stats['inserted']} inserted, "
+                    f"{stats['updated']} updated, {stats['unchanged']} unchanged, "
+                    f"{stats['deleted']} deleted")
+    for table, changeset in results['changesets'].items():
+        log_changeset(table, changeset)
+    logger.info("=" * 50)
+
+
+def log_sources(sources: dict) -> None:
+    """输出各数据来源的健康状况"""
+    for name, stats in sources.items():
+        p50 = f"{stats['p50']:.3f}s" if stats['p50'] is not None else '-'
+        p95 = f"{stats['p95']:.3f}s" if stats['p95'] is not None else '-'
+        logger.info(f"Source {name}: success {stats['success_rate']:.1%}, "
+                    f"p50 {p50}, p95 {p95}"
+                    f"{', circuit open' if stats['circuit_open'] else ''}")
+
+
+def log_pool(stats: dict) -> None:
+    """输出数据库连接池统计"""
+    if not stats:
+        return
+    avg = f"{stats['avg_connect_ms']:.0f} ms" if stats['avg_connect_ms'] is not None else '-'
+    logger.info(f"Database pool: {stats['connects']} connects (avg {avg}), "
+                f"{stats['reuses']} reuses, {stats['health_checks']} health checks, "
+                f"{stats['discarded']} discarded, {stats['open']} open")
+
+
+def log_changeset(table: str, changeset: dict, limit: int = 20) -> None:
+    """输出变更集摘要，每类最多列出 limit 条"""
+    if not (changeset['added'] or changeset['changed'] or changeset['removed']):
+        return
+    logger.info(f"Changeset {table}: +{len(changeset['added'])} "
+                f"~{len(changeset['changed'])} -{len(changeset['removed'])}")
+    if changeset['added']:
+        logger.info(f"  added: {changeset['added'][:limit]}")
+    for change in changeset['changed'][:limit]:
+        logger.info(f"  changed {change['key']}: {', '.join(change['columns'])}")
+    if changeset['removed']:
+        logger.info(f"  removed upstream: {changeset['removed'][:limit]}")
+
 
 def main():
     # 从环境变量获取配置
@@ -281,31 +2553,51 @@ def main():
         logger.error("DATABASE_URL environment variable is required")
         sys.exit(1)
     
+    # 单个服务器、逗号分隔的列表，或 all 表示全部服务器
     server = os.environ.get('SERVER', 'cn')
-    if server not in SERVERS:
-        logger.error(f"Invalid server: {server}. Valid options: {list(SERVERS.keys())}")
+    if server == 'all':
+        servers = list(SERVERS)
+    else:
+        servers = [name.strip() for name in server.split(',') if name.strip()]
+    invalid = [name for name in servers if name not in SERVERS]
+    if not servers or invalid:
+        logger.error(f"Invalid server: {server}. Valid options: {list(SERVERS.keys())} or 'all'")
         sys.exit(1)
     
-    logger.info(f"Starting honors sync for server: {server}")
-    
-    syncer = HonorsSyncer(database_url, server)
-    try:
-        results = syncer.run()
-        
-        if results['success']:
-            logger.info("=" * 50)
-            logger.info("SYNC SUCCESSFUL")
-            logger.info(f"Server: {results['server']} ({results['server_name']})")
-            logger.info(f"Honors: {results['honors']}")
-            logger.info(f"Bonds Honors: {results['bonds_honors']}")
-            logger.info(f"Honor Groups: {results['honor_groups']}")
-            logger.info("=" * 50)
-        else:
-            logger.error(f"Sync failed: {results['error']}")
-            sys.exit(1)
+    if DAEMON:
+        logger.info(f"Starting honors sync daemon for server: {', '.join(servers)}")
+        daemon = SyncDaemon(database_url, servers)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        signal.signal(signal.SIGINT, daemon.stop)
+        try:
+            daemon.run_forever()
+        finally:
+            daemon.close()
+        return
+
+    logger.info(f"Starting honors sync for server: {', '.join(servers)}")
     
-    finally:
-        syncer.close()
+    if ASYNC_MODE:
+        all_results = asyncio.run(sync_servers_async(database_url, servers))
+    elif len(servers) == 1:
+        syncer = HonorsSyncer(database_url, servers[0])
+        try:
+            all_results = [syncer.run()]
+        finally:
+            syncer.close()
+    else:
+        all_results = sync_servers(database_url, servers)
+
+    for results in all_results:
+        log_results(results)
+    # 多个服务器共享同一份来源统计，输出最后一份即可
+    log_sources(next((results['sources'] for results in reversed(all_results) if results['sources']), {}))
+    log_pool(next((results['pool'] for results in reversed(all_results) if results['pool']), {}))
+
+    failed = [results['server'] for results in all_results if not results['success']]
+    if failed:
+        logger.error(f"Sync failed for: {', '.join(failed)}")
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,17 @@
+-- 0002: 补充同步脚本写入的 honors.group_type，并修正 v_honors_with_group
+-- 原视图 h.* 已包含 group_name，再选 hg.name AS group_name 会导致列名重复而无法创建
+
+ALTER TABLE honors ADD COLUMN IF NOT EXISTS group_type VARCHAR(50);
+
+COMMENT ON COLUMN honors.group_type IS '徽章组类型 (from honorGroups.honorType)';
+
+DROP VIEW IF EXISTS v_honors_with_group;
+
+-- 只包含上游仍存在的徽章
+CREATE VIEW v_honors_with_group AS
+SELECT
+    h.*,
+    hg.background_asset_bundle_name AS group_background_asset_bundle_name
+FROM honors h
+LEFT JOIN honor_groups hg ON h.server = hg.server AND h.group_id = hg.group_id
+WHERE h.deleted_at IS NULL;
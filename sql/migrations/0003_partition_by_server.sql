@@ -0,0 +1,134 @@
+-- 0003: honors / bonds_honors 按 server 做 LIST 分区
+-- 每个服务器一个分区 (<表名>_<server>)，索引在各分区上分别维护，不再需要 server 前缀；
+-- 同步脚本会为新服务器自动创建分区。已是分区表时跳过转换，可重复执行
+
+DROP VIEW IF EXISTS v_honors_with_group;
+
+DO $$
+DECLARE
+    s TEXT;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'honors'::regclass) THEN
+        ALTER TABLE honors RENAME TO honors_unpartitioned;
+        ALTER TABLE honors_unpartitioned RENAME CONSTRAINT honors_pkey TO honors_unpartitioned_pkey;
+        ALTER TABLE honors_unpartitioned
+            RENAME CONSTRAINT honors_server_honor_id_key TO honors_unpartitioned_server_honor_id_key;
+        DROP INDEX IF EXISTS idx_honors_server, idx_honors_group_id, idx_honors_rarity, idx_honors_content_hash;
+
+        -- 分区表的主键必须包含分区键，原 UNIQUE(server, honor_id) 改为主键；id 继续使用原序列
+        CREATE TABLE honors (
+            id INT NOT NULL DEFAULT nextval('honors_id_seq'),
+            server VARCHAR(10) NOT NULL,
+            honor_id INT NOT NULL,
+            seq INT,
+            group_id INT,
+            group_name VARCHAR(255),
+            group_type VARCHAR(50),
+            honor_rarity VARCHAR(20),
+            name VARCHAR(255),
+            asset_bundle_name VARCHAR(255),
+            levels JSONB DEFAULT '[]',
+            content_hash CHAR(40),
+            deleted_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+            PRIMARY KEY (server, honor_id)
+        ) PARTITION BY LIST (server);
+
+        FOR s IN SELECT unnest(ARRAY['cn', 'jp', 'en', 'tw', 'kr'])
+                 UNION SELECT DISTINCT server FROM honors_unpartitioned LOOP
+            EXECUTE format('CREATE TABLE %I PARTITION OF honors FOR VALUES IN (%L)', 'honors_' || s, s);
+        END LOOP;
+
+        INSERT INTO honors (
+            id, server, honor_id, seq, group_id, group_name, group_type, honor_rarity, name,
+            asset_bundle_name, levels, content_hash, deleted_at, created_at, updated_at
+        )
+        SELECT
+            id, server, honor_id, seq, group_id, group_name, group_type, honor_rarity, name,
+            asset_bundle_name, levels, content_hash, deleted_at, created_at, updated_at
+        FROM honors_unpartitioned;
+
+        ALTER SEQUENCE honors_id_seq OWNED BY honors.id;
+        DROP TABLE honors_unpartitioned;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'bonds_honors'::regclass) THEN
+        ALTER TABLE bonds_honors RENAME TO bonds_honors_unpartitioned;
+        ALTER TABLE bonds_honors_unpartitioned
+            RENAME CONSTRAINT bonds_honors_pkey TO bonds_honors_unpartitioned_pkey;
+        ALTER TABLE bonds_honors_unpartitioned
+            RENAME CONSTRAINT bonds_honors_server_bonds_honor_id_key
+            TO bonds_honors_unpartitioned_server_bonds_honor_id_key;
+        DROP INDEX IF EXISTS idx_bonds_honors_server, idx_bonds_honors_characters, idx_bonds_honors_content_hash;
+
+        CREATE TABLE bonds_honors (
+            id INT NOT NULL DEFAULT nextval('bonds_honors_id_seq'),
+            server VARCHAR(10) NOT NULL,
+            bonds_honor_id INT NOT NULL,
+            seq INT,
+            bonds_group_id INT,
+            game_character_unit_id1 INT,
+            game_character_unit_id2 INT,
+            honor_rarity VARCHAR(20),
+            name VARCHAR(255),
+            description TEXT,
+            levels JSONB DEFAULT '[]',
+            content_hash CHAR(40),
+            deleted_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+            PRIMARY KEY (server, bonds_honor_id)
+        ) PARTITION BY LIST (server);
+
+        FOR s IN SELECT unnest(ARRAY['cn', 'jp', 'en', 'tw', 'kr'])
+                 UNION SELECT DISTINCT server FROM bonds_honors_unpartitioned LOOP
+            EXECUTE format('CREATE TABLE %I PARTITION OF bonds_honors FOR VALUES IN (%L)', 'bonds_honors_' || s, s);
+        END LOOP;
+
+        INSERT INTO bonds_honors (
+            id, server, bonds_honor_id, seq, bonds_group_id, game_character_unit_id1,
+            game_character_unit_id2, honor_rarity, name, description, levels, content_hash,
+            deleted_at, created_at, updated_at
+        )
+        SELECT
+            id, server, bonds_honor_id, seq, bonds_group_id, game_character_unit_id1,
+            game_character_unit_id2, honor_rarity, name, description, levels, content_hash,
+            deleted_at, created_at, updated_at
+        FROM bonds_honors_unpartitioned;
+
+        ALTER SEQUENCE bonds_honors_id_seq OWNED BY bonds_honors.id;
+        DROP TABLE bonds_honors_unpartitioned;
+    END IF;
+END
+$$;
+
+-- 分区内 server 恒定，server 单列索引已无意义
+DROP INDEX IF EXISTS idx_honors_server;
+DROP INDEX IF EXISTS idx_bonds_honors_server;
+
+-- 在分区表上建立的索引会自动在每个分区上建立
+CREATE INDEX IF NOT EXISTS idx_honors_group_id ON honors(group_id);
+CREATE INDEX IF NOT EXISTS idx_honors_rarity ON honors(honor_rarity);
+CREATE INDEX IF NOT EXISTS idx_honors_content_hash ON honors(content_hash);
+
+CREATE INDEX IF NOT EXISTS idx_bonds_honors_characters ON bonds_honors(game_character_unit_id1, game_character_unit_id2);
+CREATE INDEX IF NOT EXISTS idx_bonds_honors_content_hash ON bonds_honors(content_hash);
+
+COMMENT ON TABLE honors IS '游戏徽章数据，按 server 分区';
+COMMENT ON TABLE bonds_honors IS '羁绊徽章数据，按 server 分区';
+COMMENT ON COLUMN honors.server IS '服务器标识: cn=国服, jp=日服, en=国际服, tw=台服, kr=韩服';
+COMMENT ON COLUMN honors.content_hash IS '上游记录内容哈希，内容变化时才会改变';
+COMMENT ON COLUMN honors.group_type IS '徽章组类型 (from honorGroups.honorType)';
+COMMENT ON COLUMN honors.deleted_at IS '上游删除该徽章的时间 (软删除)，NULL 表示仍存在';
+
+-- 只包含上游仍存在的徽章
+CREATE VIEW v_honors_with_group AS
+SELECT
+    h.*,
+    hg.background_asset_bundle_name AS group_background_asset_bundle_name
+FROM honors h
+LEFT JOIN honor_groups hg ON h.server = hg.server AND h.group_id = hg.group_id
+WHERE h.deleted_at IS NULL;
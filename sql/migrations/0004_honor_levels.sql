@@ -0,0 +1,32 @@
+-- 0004: 徽章等级拆分为 honor_levels 表 (每个徽章的每个等级一行，按 server 分区)
+-- honors.levels 仍保留完整的 JSONB；设置 HONOR_LEVELS=1 后由同步脚本在同一事务中维护本表
+
+CREATE TABLE IF NOT EXISTS honor_levels (
+    id SERIAL,
+    server VARCHAR(10) NOT NULL,
+    honor_id INT NOT NULL,                 -- 对应 honors.honor_id
+    level INT NOT NULL,                    -- 等级
+    bonus INT,                             -- 该等级的加成
+    description TEXT,                      -- 获得条件说明
+    asset_bundle_name VARCHAR(255),        -- 该等级单独的资源包 (没有时为 NULL)
+    honor_rarity VARCHAR(20),              -- 该等级的稀有度 (没有时为 NULL)
+    content_hash CHAR(40),
+    deleted_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (server, honor_id, level)
+) PARTITION BY LIST (server);
+
+CREATE TABLE IF NOT EXISTS honor_levels_cn PARTITION OF honor_levels FOR VALUES IN ('cn');
+CREATE TABLE IF NOT EXISTS honor_levels_jp PARTITION OF honor_levels FOR VALUES IN ('jp');
+CREATE TABLE IF NOT EXISTS honor_levels_en PARTITION OF honor_levels FOR VALUES IN ('en');
+CREATE TABLE IF NOT EXISTS honor_levels_tw PARTITION OF honor_levels FOR VALUES IN ('tw');
+CREATE TABLE IF NOT EXISTS honor_levels_kr PARTITION OF honor_levels FOR VALUES IN ('kr');
+
+-- 按等级查询获得条件 / 加成 (如 "5 级需要 X 的徽章")
+CREATE INDEX IF NOT EXISTS idx_honor_levels_level ON honor_levels(level, description);
+CREATE INDEX IF NOT EXISTS idx_honor_levels_bonus ON honor_levels(level, bonus);
+
+COMMENT ON TABLE honor_levels IS '徽章等级数据 (由 honors.levels 拆分)，按 server 分区';
+COMMENT ON COLUMN honor_levels.deleted_at IS '上游删除该等级的时间 (软删除)，NULL 表示仍存在';
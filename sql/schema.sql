@@ -1,27 +1,32 @@
 -- Sekai Honors Database Schema
 -- 支持多服务器: cn, jp, en, tw, kr
+-- 数据库结构以 sql/migrations 为准，同步脚本启动时会自动执行未执行的迁移；
+-- 本文件是全部迁移执行后的完整结构，修改时须同时新增对应的迁移文件
 
--- 普通徽章表
+-- 普通徽章表 (按 server 分区，每个服务器一个分区)
 CREATE TABLE IF NOT EXISTS honors (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     server VARCHAR(10) NOT NULL,           -- cn, jp, en, tw, kr
     honor_id INT NOT NULL,                 -- 游戏内徽章ID
     seq INT,                               -- 排序序号
     group_id INT,                          -- 徽章组ID
     group_name VARCHAR(255),               -- 徽章组名称 (from honorGroups)
+    group_type VARCHAR(50),                -- 徽章组类型 (from honorGroups.honorType)
     honor_rarity VARCHAR(20),              -- low, middle, high, highest
     name VARCHAR(255),                     -- 徽章名称
     asset_bundle_name VARCHAR(255),        -- 资源包名称
     levels JSONB DEFAULT '[]',             -- 徽章等级信息
+    content_hash CHAR(40),                 -- 规范化后上游记录的 SHA-1 (由同步脚本计算)
+    deleted_at TIMESTAMP,                  -- 上游已删除时的软删除时间
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
-    UNIQUE(server, honor_id)
-);
+    PRIMARY KEY (server, honor_id)
+) PARTITION BY LIST (server);
 
--- 羁绊徽章表
+-- 羁绊徽章表 (按 server 分区)
 CREATE TABLE IF NOT EXISTS bonds_honors (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     server VARCHAR(10) NOT NULL,
     bonds_honor_id INT NOT NULL,
     seq INT,
@@ -32,11 +37,50 @@ CREATE TABLE IF NOT EXISTS bonds_honors (
     name VARCHAR(255),
     description TEXT,
     levels JSONB DEFAULT '[]',
+    content_hash CHAR(40),
+    deleted_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
-    UNIQUE(server, bonds_honor_id)
-);
+    PRIMARY KEY (server, bonds_honor_id)
+) PARTITION BY LIST (server);
+
+-- 各服务器的分区 (新服务器的分区由同步脚本自动创建)
+CREATE TABLE IF NOT EXISTS honors_cn PARTITION OF honors FOR VALUES IN ('cn');
+CREATE TABLE IF NOT EXISTS honors_jp PARTITION OF honors FOR VALUES IN ('jp');
+CREATE TABLE IF NOT EXISTS honors_en PARTITION OF honors FOR VALUES IN ('en');
+CREATE TABLE IF NOT EXISTS honors_tw PARTITION OF honors FOR VALUES IN ('tw');
+CREATE TABLE IF NOT EXISTS honors_kr PARTITION OF honors FOR VALUES IN ('kr');
+
+CREATE TABLE IF NOT EXISTS bonds_honors_cn PARTITION OF bonds_honors FOR VALUES IN ('cn');
+CREATE TABLE IF NOT EXISTS bonds_honors_jp PARTITION OF bonds_honors FOR VALUES IN ('jp');
+CREATE TABLE IF NOT EXISTS bonds_honors_en PARTITION OF bonds_honors FOR VALUES IN ('en');
+CREATE TABLE IF NOT EXISTS bonds_honors_tw PARTITION OF bonds_honors FOR VALUES IN ('tw');
+CREATE TABLE IF NOT EXISTS bonds_honors_kr PARTITION OF bonds_honors FOR VALUES IN ('kr');
+
+-- 徽章等级表 (由 honors.levels 拆分，每个徽章的每个等级一行；设置 HONOR_LEVELS=1 时维护)
+CREATE TABLE IF NOT EXISTS honor_levels (
+    id SERIAL,
+    server VARCHAR(10) NOT NULL,
+    honor_id INT NOT NULL,                 -- 对应 honors.honor_id
+    level INT NOT NULL,                    -- 等级
+    bonus INT,                             -- 该等级的加成
+    description TEXT,                      -- 获得条件说明
+    asset_bundle_name VARCHAR(255),        -- 该等级单独的资源包 (没有时为 NULL)
+    honor_rarity VARCHAR(20),              -- 该等级的稀有度 (没有时为 NULL)
+    content_hash CHAR(40),
+    deleted_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (server, honor_id, level)
+) PARTITION BY LIST (server);
+
+CREATE TABLE IF NOT EXISTS honor_levels_cn PARTITION OF honor_levels FOR VALUES IN ('cn');
+CREATE TABLE IF NOT EXISTS honor_levels_jp PARTITION OF honor_levels FOR VALUES IN ('jp');
+CREATE TABLE IF NOT EXISTS honor_levels_en PARTITION OF honor_levels FOR VALUES IN ('en');
+CREATE TABLE IF NOT EXISTS honor_levels_tw PARTITION OF honor_levels FOR VALUES IN ('tw');
+CREATE TABLE IF NOT EXISTS honor_levels_kr PARTITION OF honor_levels FOR VALUES IN ('kr');
 
 -- 徽章分组表
 CREATE TABLE IF NOT EXISTS honor_groups (
@@ -46,6 +90,8 @@ CREATE TABLE IF NOT EXISTS honor_groups (
     name VARCHAR(255),
     honor_type VARCHAR(50),
     background_asset_bundle_name VARCHAR(255),
+    content_hash CHAR(40),
+    deleted_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
@@ -63,30 +109,56 @@ CREATE TABLE IF NOT EXISTS sync_logs (
     synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- 索引
-CREATE INDEX IF NOT EXISTS idx_honors_server ON honors(server);
-CREATE INDEX IF NOT EXISTS idx_honors_group_id ON honors(server, group_id);
-CREATE INDEX IF NOT EXISTS idx_honors_rarity ON honors(server, honor_rarity);
+-- 已执行的迁移 (由同步脚本维护)
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    checksum CHAR(64) NOT NULL,            -- 迁移文件内容的 SHA-256 (统一为 LF 换行)
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 已有数据库补充新增列
+ALTER TABLE honors ADD COLUMN IF NOT EXISTS content_hash CHAR(40);
+ALTER TABLE bonds_honors ADD COLUMN IF NOT EXISTS content_hash CHAR(40);
+ALTER TABLE honor_groups ADD COLUMN IF NOT EXISTS content_hash CHAR(40);
+ALTER TABLE honors ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE bonds_honors ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE honor_groups ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE honors ADD COLUMN IF NOT EXISTS group_type VARCHAR(50);
+
+-- 索引 (分区表上的索引在每个分区上分别建立，分区内 server 恒定，不需要 server 前缀)
+CREATE INDEX IF NOT EXISTS idx_honors_group_id ON honors(group_id);
+CREATE INDEX IF NOT EXISTS idx_honors_rarity ON honors(honor_rarity);
+CREATE INDEX IF NOT EXISTS idx_honors_content_hash ON honors(content_hash);
+
+CREATE INDEX IF NOT EXISTS idx_bonds_honors_characters ON bonds_honors(game_character_unit_id1, game_character_unit_id2);
+CREATE INDEX IF NOT EXISTS idx_bonds_honors_content_hash ON bonds_honors(content_hash);
 
-CREATE INDEX IF NOT EXISTS idx_bonds_honors_server ON bonds_honors(server);
-CREATE INDEX IF NOT EXISTS idx_bonds_honors_characters ON bonds_honors(server, game_character_unit_id1, game_character_unit_id2);
+CREATE INDEX IF NOT EXISTS idx_honor_levels_level ON honor_levels(level, description);
+CREATE INDEX IF NOT EXISTS idx_honor_levels_bonus ON honor_levels(level, bonus);
 
 CREATE INDEX IF NOT EXISTS idx_honor_groups_server ON honor_groups(server);
+CREATE INDEX IF NOT EXISTS idx_honor_groups_content_hash ON honor_groups(server, content_hash);
 
 CREATE INDEX IF NOT EXISTS idx_sync_logs_server ON sync_logs(server, synced_at DESC);
 
--- 用于查询的视图
-CREATE OR REPLACE VIEW v_honors_with_group AS
+-- 用于查询的视图 (只包含上游仍存在的徽章；group_name / group_type 已在 honors 中)
+DROP VIEW IF EXISTS v_honors_with_group;
+CREATE VIEW v_honors_with_group AS
 SELECT 
     h.*,
-    hg.name as group_name,
-    hg.honor_type,
-    hg.background_asset_bundle_name
+    hg.background_asset_bundle_name AS group_background_asset_bundle_name
 FROM honors h
-LEFT JOIN honor_groups hg ON h.server = hg.server AND h.group_id = hg.group_id;
+LEFT JOIN honor_groups hg ON h.server = hg.server AND h.group_id = hg.group_id
+WHERE h.deleted_at IS NULL;
 
 -- 注释
-COMMENT ON TABLE honors IS '游戏徽章数据，支持多服务器';
-COMMENT ON TABLE bonds_honors IS '羁绊徽章数据，支持多服务器';
+COMMENT ON TABLE honors IS '游戏徽章数据，按 server 分区';
+COMMENT ON TABLE bonds_honors IS '羁绊徽章数据，按 server 分区';
+COMMENT ON TABLE honor_levels IS '徽章等级数据 (由 honors.levels 拆分)，按 server 分区';
 COMMENT ON TABLE honor_groups IS '徽章分组数据，支持多服务器';
-COMMENT ON COLUMN honors.server IS '服务器标识: cn=国服, jp=日服, en=国际服, tw=台服, kr=韩服';
\ No newline at end of file
+COMMENT ON COLUMN honors.server IS '服务器标识: cn=国服, jp=日服, en=国际服, tw=台服, kr=韩服';
+COMMENT ON COLUMN honors.content_hash IS '上游记录内容哈希，内容变化时才会改变';
+COMMENT ON COLUMN honors.group_type IS '徽章组类型 (from honorGroups.honorType)';
+COMMENT ON COLUMN honors.deleted_at IS '上游删除该徽章的时间 (软删除)，NULL 表示仍存在';
+COMMENT ON COLUMN honor_levels.deleted_at IS '上游删除该等级的时间 (软删除)，NULL 表示仍存在';
@@ -0,0 +1,112 @@
+"""LOAD_METHOD 各写库方式 (values / copy / pipeline) 的对比测试
+
+需要一个可随意写入的 PostgreSQL 数据库，设置 TEST_DATABASE_URL 后运行:
+
+    TEST_DATABASE_URL=postgresql://... python -m unittest tests/test_load_methods.py
+
+未设置时跳过。测试会执行迁移，并清空 honors 表中 cn 服务器的数据。
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+os.environ.setdefault('CACHE_DIR', '')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import psycopg2  # noqa: E402
+
+import sync_honors  # noqa: E402
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+COLUMNS = ('server', 'honor_id', 'seq', 'group_id', 'group_name', 'group_type',
+           'honor_rarity', 'name', 'asset_bundle_name', 'levels')
+KEY = ('server', 'honor_id')
+
+
+def honor_rows(count: int, renamed: tuple = (), removed: tuple = (), added: int = 0) -> list:
+    """生成 honors 行；名称中包含 COPY 需要转义的字符"""
+    rows = []
+    for i in range(1, count + added + 1):
+        if i in removed:
+            continue
+        name = f"徽章\t{i}\\n" + (' renamed' if i in renamed else '')
+        levels = [{'honorId': i, 'level': level, 'bonus': level * 10, 'description': f"条件\n{level}"}
+                  for level in range(1, 4)]
+        rows.append(('cn', i, i * 10, i % 3 + 1, f'group{i % 3}', 'event', 'low', name, None, levels))
+    return rows
+
+
+ROUNDS = (
+    honor_rows(40),
+    # 变化、未变化、新增与删除 (删除比例低于 DELETE_MAX_RATIO)
+    honor_rows(40, renamed=(2, 3), removed=(5,), added=2),
+)
+
+
+def connect(method: str):
+    if method == 'pipeline':
+        return sync_honors.psycopg.connect(TEST_DATABASE_URL, autocommit=False)
+    return psycopg2.connect(TEST_DATABASE_URL)
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, 'TEST_DATABASE_URL is not set')
+class LoadMethodComparisonTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        conn = psycopg2.connect(TEST_DATABASE_URL)
+        try:
+            sync_honors.ensure_schema(conn)
+        finally:
+            conn.close()
+
+    def run_method(self, method: str, strategy: str) -> tuple:
+        """用指定写库方式依次同步 ROUNDS，返回 (各轮计数, 最终表内容)"""
+        conn = connect(method)
+        syncer = sync_honors.HonorsSyncer(TEST_DATABASE_URL, 'cn')
+        syncer.conn = conn
+        stats = []
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM honors WHERE server = 'cn'")
+            conn.commit()
+            with mock.patch.multiple(sync_honors, LOAD_METHOD=method, SYNC_STRATEGY=strategy,
+                                     DELETE_MODE='soft'):
+                for rows in ROUNDS:
+                    stats.append(syncer._sync_table(
+                        'honors', COLUMNS, KEY, iter(rows), jsonb=('levels',),
+                        partition=syncer._ensure_partition('honors'),
+                    ))
+                    conn.commit()
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {', '.join(COLUMNS)}, content_hash, deleted_at IS NULL
+                    FROM honors WHERE server = 'cn' ORDER BY honor_id
+                """)
+                contents = cur.fetchall()
+        finally:
+            syncer.conn = None
+            syncer.close()
+            conn.close()
+        return stats, contents
+
+    def test_methods_write_identical_rows(self):
+        methods = ['values', 'copy']
+        if sync_honors.psycopg is not None:
+            methods.append('pipeline')
+
+        for strategy in ('diff', 'full'):
+            expected_stats, expected_contents = self.run_method('values', strategy)
+            self.assertEqual(len(expected_contents), 42)
+            self.assertEqual(expected_stats[1]['updated'], 2)
+            self.assertEqual(expected_stats[1]['deleted'], 1)
+            for method in methods[1:]:
+                with self.subTest(strategy=strategy, method=method):
+                    stats, contents = self.run_method(method, strategy)
+                    self.assertEqual(stats, expected_stats)
+                    self.assertEqual(contents, expected_contents)
+
+
+if __name__ == '__main__':
+    unittest.main()